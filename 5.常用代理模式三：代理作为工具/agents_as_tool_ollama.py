@@ -1,10 +1,20 @@
 import asyncio  # 导入异步IO库，用于支持异步操作
+import hashlib  # 导入哈希库，用于生成缓存键
+import json  # 导入JSON库，用于解析工具参数和读写磁盘缓存
+import re  # 导入正则表达式库，用于本地解析翻译请求
+import sys  # 导入系统库，用于读取命令行参数
+import time  # 导入时间库，用于统计耗时
+import unicodedata  # 导入Unicode工具库，用于规范化待翻译文本
+from collections import OrderedDict  # 导入有序字典，用于实现LRU缓存
+from pathlib import Path  # 导入路径库，用于磁盘缓存目录
 
 from openai import AsyncOpenAI  # 导入OpenAI异步客户端
 from openai.types.responses import ResponseContentPartDoneEvent, ResponseTextDeltaEvent  # 导入响应类型定义
+from pydantic import BaseModel  # 导入Pydantic基类，用于定义结构化输出
 
 # 导入agents库中的核心组件
-from agents import Agent, ItemHelpers, MessageOutputItem, Runner, trace, ModelSettings, OpenAIChatCompletionsModel, set_default_openai_client
+from agents import Agent, AgentsException, FunctionTool, ItemHelpers, MessageOutputItem, Runner, RunContextWrapper, RunResult, ToolCallItem, ToolCallOutputItem, trace, ModelSettings, OpenAIChatCompletionsModel, function_tool, set_default_openai_client
+from agents.tool import default_tool_error_function  # 导入SDK默认的工具错误信息函数
 
 """
 该示例展示了"代理作为工具"模式。前线代理接收用户消息，然后选择调用哪些代理作为工具。
@@ -20,6 +30,15 @@ CONFIG = {
     "temperature": 0.5,  # 默认温度参数，控制输出的随机性
     "api_base": "http://localhost:11434/v1",  # Ollama API地址，指向本地运行的Ollama服务
     "timeout": 120.0,  # API超时时间，单位为秒
+    "parallel_tool_calls": True,  # 是否允许协调器在一轮回复中同时发出多个工具调用，同一轮的调用会被并发执行
+    "max_parallel_translations": 3,  # 同时运行的翻译代理数量上限
+    "translation_cache": True,  # 是否在翻译工具前启用翻译结果缓存
+    "translation_cache_size": 1024,  # 内存LRU缓存最多保存的翻译条数
+    "translation_cache_dir": None,  # 磁盘缓存目录，例如".translation_cache"；为None时只使用内存缓存
+    "translation_cache_deterministic_only": False,  # 为True时只在温度为0（输出确定）时启用缓存
+    "direct_fanout": True,  # 请求中明确给出目标语言时，跳过协调器直接并发调用翻译代理
+    "translation_strategy": "per_agent",  # 翻译引擎："per_agent"每种语言运行一个翻译代理，"multi_target"一次模型调用输出所有语言
+    "multi_target_max_retries": 2,  # 多目标引擎对缺失或无效语言的最大重试次数，仍失败时回退到单语言翻译代理
 }
 
 # 设置OpenAI兼容的Ollama客户端
@@ -42,6 +61,166 @@ class OllamaOpenAIChatCompletionsModel(OpenAIChatCompletionsModel):
         async for event in await super().stream_raw_text(*args, **kwargs):
             yield event  # 直接传递事件，如果需要可以在这里对Ollama特有的响应格式进行处理
 
+
+# 限制同时运行的翻译代理数量，避免并发请求压垮本地Ollama服务
+translation_semaphore = asyncio.Semaphore(CONFIG["max_parallel_translations"])
+
+
+def limit_tool_concurrency(tool: FunctionTool, semaphore: asyncio.Semaphore) -> FunctionTool:
+    """
+    为代理工具加上并发上限
+
+    同一轮模型回复中发出的多个工具调用会被SDK并发执行，并按调用顺序返回结果；
+    这里用信号量控制同时运行的嵌套代理数量。翻译工具彼此独立，因此可以安全地并发执行。
+    """
+    original_invoke = tool.on_invoke_tool
+
+    async def limited_on_invoke_tool(ctx, input_str):
+        async with semaphore:
+            return await original_invoke(ctx, input_str)
+
+    tool.on_invoke_tool = limited_on_invoke_tool
+    return tool
+
+
+def normalize_text(text: str) -> str:
+    """规范化待翻译文本：统一Unicode形式并合并多余空白，使等价的输入得到相同的缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TranslationCache:
+    """
+    翻译结果缓存，包含内存LRU层和可选的磁盘层
+
+    缓存键由规范化后的原文、目标语言、模型名称和温度组成，
+    重复的界面文案、模板和常用短语可以直接返回，而无需再运行一次嵌套代理。
+    """
+
+    def __init__(self, max_size: int = 1024, cache_dir: str | None = None):
+        """
+        初始化翻译缓存
+
+        参数:
+            max_size: 内存LRU层最多保存的条目数
+            cache_dir: 磁盘层的目录，为None时不使用磁盘层
+        """
+        self.max_size = max_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self.enabled = True  # 为False时跳过缓存，例如在基准测试中测量真实的模型耗时
+        self.memory_hits = 0  # 内存层命中次数
+        self.disk_hits = 0  # 磁盘层命中次数
+        self.misses = 0  # 未命中次数
+
+    @staticmethod
+    def make_key(text: str, language: str, model: str, temperature: float | None) -> str:
+        """根据规范化原文、目标语言、模型和温度生成缓存键"""
+        raw = json.dumps([normalize_text(text), language, model, temperature], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """查找缓存，依次查询内存层和磁盘层，磁盘层命中时回填内存层"""
+        if not self.enabled:
+            return None
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+
+        if self.cache_dir:
+            path = self.cache_dir / f"{key}.json"
+            if path.exists():
+                try:
+                    value = json.loads(path.read_text(encoding="utf-8"))["translation"]
+                except (OSError, ValueError, KeyError):
+                    value = None
+                if value is not None:
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        """写入缓存，同时写入内存层和磁盘层"""
+        if not self.enabled:
+            return
+
+        self._remember(key, value)
+        if self.cache_dir:
+            path = self.cache_dir / f"{key}.json"
+            try:
+                path.write_text(json.dumps({"translation": value}, ensure_ascii=False), encoding="utf-8")
+            except OSError as e:
+                print(f"写入翻译缓存失败: {str(e)}")
+
+    def _remember(self, key: str, value: str) -> None:
+        """写入内存LRU层，超出容量时淘汰最久未使用的条目"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """缓存命中率"""
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> str:
+        """返回缓存统计信息"""
+        return (
+            f"翻译缓存命中率: {self.hit_rate:.0%} "
+            f"(内存命中 {self.memory_hits}，磁盘命中 {self.disk_hits}，未命中 {self.misses})"
+        )
+
+
+translation_cache = TranslationCache(
+    max_size=CONFIG["translation_cache_size"],
+    cache_dir=CONFIG["translation_cache_dir"],
+)
+
+
+def cache_tool_results(tool: FunctionTool, cache: TranslationCache, agent: Agent, language: str) -> FunctionTool:
+    """
+    在代理工具前加上翻译缓存
+
+    参数:
+        tool: 由as_tool生成的翻译工具
+        cache: 翻译缓存
+        agent: 工具背后的翻译代理，用于取得模型名称和温度
+        language: 目标语言
+    """
+    model_name = getattr(agent.model, "model", str(agent.model))
+    temperature = agent.model_settings.temperature
+    original_invoke = tool.on_invoke_tool
+
+    async def cached_on_invoke_tool(ctx, input_str):
+        try:
+            text = json.loads(input_str)["input"]
+        except (ValueError, KeyError, TypeError):
+            # 参数无法解析时交给原始工具处理错误
+            return await original_invoke(ctx, input_str)
+
+        key = cache.make_key(text, language, model_name, temperature)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        # 嵌套代理运行失败时异常直接向外抛出，不会写入缓存
+        result = await original_invoke(ctx, input_str)
+        if result:
+            cache.put(key, str(result))
+        return result
+
+    tool.on_invoke_tool = cached_on_invoke_tool
+    return tool
+
+
 # 创建西班牙语翻译代理
 spanish_agent = Agent(
     name="spanish_agent",  # 代理名称
@@ -102,41 +281,251 @@ english_agent = Agent(
     model_settings=ModelSettings(temperature=CONFIG["temperature"]),
 )
 
+# 可用的翻译代理：语言标识 -> (翻译代理, 语言名称)
+TRANSLATORS = {
+    "spanish": (spanish_agent, "西班牙语"),
+    "french": (french_agent, "法语"),
+    "italian": (italian_agent, "意大利语"),
+    "chinese": (chinese_agent, "中文"),
+    "english": (english_agent, "英语"),
+}
+
+
+def agent_as_raising_tool(agent: Agent, tool_name: str, tool_description: str) -> FunctionTool:
+    """
+    与agent.as_tool相同，但嵌套代理运行失败时直接抛出异常，而不是返回错误文本
+
+    as_tool使用默认的failure_error_function，会把失败变成普通的字符串结果，
+    缓存层无法把它和译文区分开；这里让异常穿过缓存层，由report_tool_errors统一转换。
+    """
+
+    @function_tool(name_override=tool_name, description_override=tool_description, failure_error_function=None)
+    async def run_agent(context: RunContextWrapper, input: str) -> str:
+        output = await Runner.run(starting_agent=agent, input=input, context=context.context)
+        return ItemHelpers.text_message_outputs(output.new_items)
+
+    return run_agent
+
+
+def report_tool_errors(tool: FunctionTool) -> FunctionTool:
+    """把工具抛出的异常转换为错误信息返回给模型（与SDK默认的failure_error_function相同）"""
+    original_invoke = tool.on_invoke_tool
+
+    async def reporting_on_invoke_tool(ctx, input_str):
+        try:
+            return await original_invoke(ctx, input_str)
+        except Exception as e:
+            return default_tool_error_function(ctx, e)
+
+    tool.on_invoke_tool = reporting_on_invoke_tool
+    return tool
+
+
+def translation_cache_enabled(agent: Agent) -> bool:
+    """按CONFIG判断该代理的翻译结果是否可以缓存"""
+    deterministic = agent.model_settings.temperature == 0
+    return CONFIG["translation_cache"] and (deterministic or not CONFIG["translation_cache_deterministic_only"])
+
+
+def build_translation_tool(language: str) -> FunctionTool:
+    """
+    将翻译代理包装为工具，统一加上并发上限和翻译缓存
+
+    参数:
+        language: TRANSLATORS中的语言标识
+    """
+    agent, language_name = TRANSLATORS[language]
+    tool = agent_as_raising_tool(
+        agent,
+        tool_name=f"translate_to_{language}",  # 工具名称
+        tool_description=f"将用户的消息翻译成{language_name}",  # 工具描述
+    )
+    tool = limit_tool_concurrency(tool, translation_semaphore)
+
+    # 缓存放在并发上限之外，命中缓存的调用不占用并发名额；只有成功的运行才会写入缓存
+    if translation_cache_enabled(agent):
+        tool = cache_tool_results(tool, translation_cache, agent, language)
+
+    # 错误转换放在最外层，失败信息不会进入缓存
+    return report_tool_errors(tool)
+
+
+# 语言标识 -> 翻译工具，协调器和直接分发模式共用同一组工具（共享并发上限和缓存）
+TRANSLATION_TOOLS = {language: build_translation_tool(language) for language in TRANSLATORS}
+
+
+class LanguageTranslation(BaseModel):
+    language: str
+    """目标语言标识，例如spanish"""
+
+    translation: str
+    """该语言的译文"""
+
+
+class MultiTranslation(BaseModel):
+    translations: list[LanguageTranslation]
+    """每种目标语言的译文"""
+
+
+# 创建多目标翻译代理，一次模型调用输出所有目标语言的译文
+multi_translator_agent = Agent(
+    name="multi_translator_agent",
+    instructions=(
+        "你负责将用户给出的文本同时翻译成多种目标语言。"
+        "对每一种要求的语言标识都给出一条译文，language字段必须与要求的语言标识完全一致。"
+        "只输出译文本身，不要添加解释。"
+    ),
+    output_type=MultiTranslation,
+    model=OllamaOpenAIChatCompletionsModel(
+        model=CONFIG["model_name"],
+        openai_client=external_client,
+    ),
+    model_settings=ModelSettings(temperature=CONFIG["temperature"]),
+)
+
+
+async def translate_multi_target(text: str, languages: list[str]) -> dict[str, str]:
+    """
+    用一次结构化输出的模型调用完成多种语言的翻译
+
+    原文和指令只需预填充一次。结构化输出会先做校验：缺失、为空或语言标识不匹配的条目
+    只针对这些语言重试；超过重试次数仍失败的语言回退到对应的单语言翻译代理。
+    命中翻译缓存的语言不会再发给模型。
+
+    参数:
+        text: 待翻译文本
+        languages: 语言标识列表
+
+    返回:
+        语言标识 -> 译文
+    """
+    model_name = getattr(multi_translator_agent.model, "model", str(multi_translator_agent.model))
+    temperature = multi_translator_agent.model_settings.temperature
+    use_cache = translation_cache_enabled(multi_translator_agent)  # 与单语言翻译工具使用相同的缓存开关
+    results: dict[str, str] = {}
+
+    # 先查询翻译缓存，只把未命中的语言发给模型
+    pending = []
+    for language in languages:
+        cached = (
+            translation_cache.get(translation_cache.make_key(text, language, model_name, temperature))
+            if use_cache else None
+        )
+        if cached is not None:
+            results[language] = cached
+        else:
+            pending.append(language)
+
+    for attempt in range(CONFIG["multi_target_max_retries"] + 1):
+        if not pending:
+            break
+
+        targets = "、".join(f"{language}（{TRANSLATORS[language][1]}）" for language in pending)
+        try:
+            async with translation_semaphore:
+                result = await Runner.run(
+                    multi_translator_agent,
+                    f"目标语言: {targets}\n\n待翻译文本:\n{text}",
+                )
+            output = result.final_output_as(MultiTranslation)
+        except AgentsException as e:
+            # 输出不符合结构要求时，本轮请求的所有语言都需要重试
+            print(f"多目标翻译第 {attempt+1} 次尝试失败: {str(e)}")
+            continue
+
+        # 校验每条译文，只接受请求中的语言且内容非空
+        for item in output.translations:
+            language = item.language.strip().lower()
+            if language in pending and item.translation.strip():
+                results[language] = item.translation.strip()
+                if use_cache:
+                    translation_cache.put(
+                        translation_cache.make_key(text, language, model_name, temperature), results[language]
+                    )
+        pending = [language for language in pending if language not in results]
+
+    if pending:
+        # 多次重试仍缺失的语言，回退到单语言翻译代理
+        print(f"多目标翻译缺少 {'、'.join(pending)}，回退到单语言翻译代理")
+        for language, translation in zip(pending, await translate_per_agent(text, pending)):
+            results[language] = translation
+
+    return results
+
+
+async def translate_per_agent(text: str, languages: list[str]) -> list[str]:
+    """每种语言并发运行一个翻译代理，按语言顺序返回译文"""
+    context = RunContextWrapper(context=None)
+    arguments = json.dumps({"input": text}, ensure_ascii=False)
+    outputs = await asyncio.gather(
+        *(TRANSLATION_TOOLS[language].on_invoke_tool(context, arguments) for language in languages)
+    )
+    return [str(output) for output in outputs]
+
+
+async def translate(text: str, languages: list[str], strategy: str | None = None) -> list[str]:
+    """
+    按所选翻译引擎完成多种语言的翻译
+
+    参数:
+        text: 待翻译文本
+        languages: 语言标识列表
+        strategy: "per_agent" 或 "multi_target"，默认使用CONFIG中的配置
+
+    返回:
+        按语言顺序排列的译文列表
+    """
+    strategy = strategy or CONFIG["translation_strategy"]
+    if strategy == "multi_target":
+        results = await translate_multi_target(text, languages)
+        return [results[language] for language in languages]
+    return await translate_per_agent(text, languages)
+
+
+@function_tool
+async def translate_to_languages(input: str, languages: list[str]) -> str:
+    """
+    在一次调用中将用户的消息翻译成多种语言。
+
+    Args:
+        input: 要翻译的消息。
+        languages: 目标语言标识列表，可选值为 spanish、french、italian、chinese、english。
+    """
+    targets = [language.strip().lower() for language in languages if language.strip().lower() in TRANSLATORS]
+    if not targets:
+        return f"不支持的目标语言: {languages}，可选值为 {', '.join(TRANSLATORS)}"
+
+    results = await translate_multi_target(input, targets)
+    return "\n\n".join(f"[{TRANSLATORS[language][1]}]\n{results[language]}" for language in targets)
+
+
 # 创建协调器代理，负责选择和调用合适的翻译代理
 orchestrator_agent = Agent(
     name="orchestrator_agent",
     instructions=(
         "你是一个翻译代理。你使用提供给你的工具进行翻译。"
-        "如果被要求进行多种翻译，你将按顺序调用相关工具。"
-        "你永远不要自己翻译，而是始终使用提供的工具。"
+        + (
+            "如果被要求进行多种翻译，你将在同一轮回复中一次性调用所有相关工具，它们会被同时执行。"
+            if CONFIG["parallel_tool_calls"]
+            else "如果被要求进行多种翻译，你将按顺序调用相关工具。"
+        )
+        + "你永远不要自己翻译，而是始终使用提供的工具。"
+    ),
+    # 将各个翻译代理注册为工具；多目标引擎只注册一个一次翻译多种语言的工具
+    tools=(
+        [translate_to_languages]
+        if CONFIG["translation_strategy"] == "multi_target"
+        else list(TRANSLATION_TOOLS.values())
     ),
-    tools=[  # 将各个翻译代理注册为工具
-        spanish_agent.as_tool(
-            tool_name="translate_to_spanish",  # 工具名称
-            tool_description="将用户的消息翻译成西班牙语",  # 工具描述
-        ),
-        french_agent.as_tool(
-            tool_name="translate_to_french",
-            tool_description="将用户的消息翻译成法语",
-        ),
-        italian_agent.as_tool(
-            tool_name="translate_to_italian",
-            tool_description="将用户的消息翻译成意大利语",
-        ),
-        chinese_agent.as_tool(
-            tool_name="translate_to_chinese",
-            tool_description="将用户的消息翻译成中文",
-        ),
-        english_agent.as_tool(
-            tool_name="translate_to_english",
-            tool_description="将用户的消息翻译成英语",
-        ),
-    ],
     model=OllamaOpenAIChatCompletionsModel(
         model=CONFIG["model_name"], 
         openai_client=external_client,
     ),
-    model_settings=ModelSettings(temperature=CONFIG["temperature"]),
+    # 允许一轮回复中包含多个工具调用，SDK会并发执行它们
+    model_settings=ModelSettings(
+        temperature=CONFIG["temperature"],
+        parallel_tool_calls=CONFIG["parallel_tool_calls"],
+    ),
 )
 
 # 创建合成代理，用于检查翻译结果并生成最终响应
@@ -151,6 +540,159 @@ synthesizer_agent = Agent(
 )
 
 
+# 语言名称的各种写法 -> 语言标识，用于本地解析请求中明确给出的目标语言
+LANGUAGE_ALIASES = {
+    "西班牙语": "spanish", "西班牙文": "spanish", "spanish": "spanish", "español": "spanish",
+    "法语": "french", "法文": "french", "french": "french", "français": "french",
+    "意大利语": "italian", "意大利文": "italian", "italian": "italian", "italiano": "italian",
+    "中文": "chinese", "汉语": "chinese", "chinese": "chinese",
+    "英语": "english", "英文": "english", "english": "english",
+}
+
+# 能够本地解析的请求格式，text为待翻译内容，langs为目标语言列表
+REQUEST_PATTERNS = [
+    re.compile(r"^(?:请|帮我|麻烦)?(?:把|将)(?P<text>.+?)(?:翻译|译)成(?P<langs>[^:：]+?)[。.!！]?$", re.S),
+    re.compile(r"^(?:请|帮我|麻烦)?(?:翻译|译)成(?P<langs>[^:：]+?)[:：]\s*(?P<text>.+)$", re.S),
+    # 文本本身可能包含to/into（例如"how to cook rice"），贪婪匹配使目标语言绑定到最后一个into/to
+    re.compile(r"^(?:please\s+)?translate\s+(?P<text>.+)\s+(?:into|to)\s+(?P<langs>[^:]+?)[.!]?$", re.S | re.I),
+    re.compile(r"^(?:please\s+)?translate\s+(?:into|to)\s+(?P<langs>[^:]+?):\s*(?P<text>.+)$", re.S | re.I),
+]
+
+# 目标语言列表中的分隔符
+LANGUAGE_SEPARATORS = re.compile(r"\s*(?:,|，|、|/|和|以及|及|与|还有|\band\b|&)\s*", re.I)
+
+
+def parse_translation_request(msg: str) -> tuple[str, list[str]] | None:
+    """
+    在本地解析明确给出目标语言的翻译请求
+
+    参数:
+        msg: 用户输入
+
+    返回:
+        (待翻译文本, 语言标识列表)；请求格式不明确或包含无法识别的语言时返回None，交给协调器处理
+
+    示例（可用 python -m doctest agents_as_tool_ollama.py 检查）:
+        >>> parse_translation_request("把你好翻译成英语和法语")
+        ('你好', ['english', 'french'])
+        >>> parse_translation_request("translate how to cook rice into french")
+        ('how to cook rice', ['french'])
+        >>> parse_translation_request("translate I am going to school into spanish")
+        ('I am going to school', ['spanish'])
+        >>> parse_translation_request("帮我看看这段话") is None
+        True
+    """
+    for pattern in REQUEST_PATTERNS:
+        match = pattern.match(msg.strip())
+        if not match:
+            continue
+
+        text = match.group("text").strip().strip("\"'“”‘’「」")
+        languages: list[str] = []
+        for name in LANGUAGE_SEPARATORS.split(match.group("langs").strip()):
+            if not name:
+                continue
+            language = LANGUAGE_ALIASES.get(name.strip().lower())
+            if language is None:
+                return None  # 出现无法识别的语言，视为不明确的请求
+            if language not in languages:
+                languages.append(language)
+
+        if text and languages:
+            return text, languages
+    return None
+
+
+async def run_direct_fanout(text: str, languages: list[str]) -> list[tuple[str, str]]:
+    """
+    跳过协调器，直接用所选翻译引擎完成翻译
+
+    参数:
+        text: 待翻译文本
+        languages: 语言标识列表
+
+    返回:
+        按请求顺序排列的 (语言名称, 译文) 列表
+    """
+    outputs = await translate(text, languages)
+    return [(TRANSLATORS[language][1], output) for language, output in zip(languages, outputs)]
+
+
+def orchestrated_input_items(msg: str, text: str, languages: list[str], translations: list[tuple[str, str]]) -> list[dict]:
+    """
+    构造经过协调器时合成代理会收到的完整编排记录（用户请求、每个翻译工具的调用参数和输出），
+    用于在直接调用路径上估算精简前的输入token数
+
+    参数:
+        msg: 原始请求
+        text: 待翻译文本
+        languages: 语言标识列表
+        translations: 按请求顺序排列的 (语言名称, 译文) 列表
+    """
+    items: list[dict] = [{"role": "user", "content": msg}]
+    for i, (language, (_, translation)) in enumerate(zip(languages, translations)):
+        items.append({
+            "type": "function_call",
+            "call_id": f"call_{i}",
+            "name": f"translate_to_{language}",
+            "arguments": json.dumps({"input": text}, ensure_ascii=False),
+        })
+        items.append({"type": "function_call_output", "call_id": f"call_{i}", "output": translation})
+    return items
+
+
+def format_translation_results(msg: str, translations: list[tuple[str, str]]) -> str:
+    """将原始请求和各语言的译文整理为合成代理的输入"""
+    lines = [f"原始请求: {msg}", "", "翻译结果:"]
+    for language_name, translation in translations:
+        lines.append(f"[{language_name}]\n{translation}")
+    return "\n".join(lines)
+
+
+def extract_tool_outputs(result: RunResult) -> list[tuple[str, str]]:
+    """
+    从协调器的运行结果中只提取翻译工具的输出，丢弃工具调用参数和中间消息
+
+    协调器没有调用任何翻译工具时（例如自由格式或含义不明确的请求），退回到协调器自己的回复，
+    避免合成代理收到空的翻译结果。
+
+    返回:
+        按调用顺序排列的 (语言名称, 译文) 列表
+    """
+    tool_names: dict[str, str] = {}
+    outputs: list[tuple[str, str]] = []
+    for item in result.new_items:
+        if isinstance(item, ToolCallItem):
+            call_id = getattr(item.raw_item, "call_id", None)
+            name = getattr(item.raw_item, "name", "")
+            if call_id:
+                tool_names[call_id] = name
+        elif isinstance(item, ToolCallOutputItem):
+            name = tool_names.get(item.raw_item.get("call_id", ""), "")
+            language = name.removeprefix("translate_to_")
+            label = TRANSLATORS[language][1] if language in TRANSLATORS else name or "翻译"
+            outputs.append((label, str(item.output)))
+
+    if not outputs:
+        replies = [ItemHelpers.text_message_output(item) for item in result.new_items if isinstance(item, MessageOutputItem)]
+        reply = "\n".join(text for text in replies if text) or str(result.final_output or "")
+        if reply:
+            outputs.append(("协调器回复", reply))
+    return outputs
+
+
+def estimate_tokens(data) -> int:
+    """
+    粗略估算输入的token数：中日韩字符按每字1个token计算，其余字符按每4个字符1个token计算
+
+    参数:
+        data: 字符串或输入项列表
+    """
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff" or "\u3040" <= ch <= "\u30ff")
+    return cjk + (len(text) - cjk) // 4
+
+
 async def main():
     """主函数，处理用户输入并运行代理系统"""
     try:
@@ -159,21 +701,50 @@ async def main():
 
         # 在单个跟踪中运行整个编排过程
         with trace("编排评估器"):  # 开始一个跟踪块，用于性能监控或日志记录
-            # 运行协调器代理处理用户输入
-            orchestrator_result = await Runner.run(orchestrator_agent, msg)
-
-            # 输出协调器的处理步骤
-            for item in orchestrator_result.new_items:
-                if isinstance(item, MessageOutputItem):
-                    text = ItemHelpers.text_message_output(item)
-                    if text:
-                        print(f"  --- 翻译步骤: --- \n {text}")
-
-            # 将协调器的结果传递给合成代理进行最终处理
-            synthesizer_result = await Runner.run(
-                synthesizer_agent, orchestrator_result.to_input_list()
-            )
+            start_time = time.perf_counter()
+            request = parse_translation_request(msg) if CONFIG["direct_fanout"] else None
+
+            if request:
+                # 目标语言明确：跳过协调器，直接并发调用翻译代理
+                text, languages = request
+                print(f"检测到明确的目标语言: {'、'.join(TRANSLATORS[language][1] for language in languages)}，直接调用翻译代理")
+                translations = await run_direct_fanout(text, languages)
+                print(f"翻译阶段耗时: {time.perf_counter() - start_time:.2f}秒")
+                for language_name, translation in translations:
+                    print(f"  --- 翻译步骤: --- \n {language_name}: {translation}")
+
+                synthesizer_input = format_translation_results(msg, translations)
+                full_tokens = estimate_tokens(orchestrated_input_items(msg, text, languages, translations))
+                pruned_tokens = estimate_tokens(synthesizer_input)
+                print(f"合成阶段输入约 {full_tokens} tokens（经协调器时的估算），精简后约 {pruned_tokens} tokens")
+            else:
+                # 运行协调器代理处理用户输入，同一轮中的多个翻译工具调用会被并发执行
+                orchestrator_result = await Runner.run(orchestrator_agent, msg)
+                print(f"翻译阶段耗时: {time.perf_counter() - start_time:.2f}秒")
+
+                # 输出协调器的处理步骤
+                for item in orchestrator_result.new_items:
+                    if isinstance(item, MessageOutputItem):
+                        text = ItemHelpers.text_message_output(item)
+                        if text:
+                            print(f"  --- 翻译步骤: --- \n {text}")
+
+                # 合成代理只需要原始请求和各翻译工具的输出，不需要完整的编排记录
+                synthesizer_input = format_translation_results(msg, extract_tool_outputs(orchestrator_result))
+                full_tokens = estimate_tokens(orchestrator_result.to_input_list())
+                pruned_tokens = estimate_tokens(synthesizer_input)
+                print(f"合成阶段输入约 {full_tokens} tokens，精简后约 {pruned_tokens} tokens")
+
+            # 将翻译结果传递给合成代理进行最终处理，并流式输出合并后的回答
+            print("--------------------------------")
+            synthesizer_result = Runner.run_streamed(synthesizer_agent, synthesizer_input)
+            async for event in synthesizer_result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    print(event.data.delta, end="", flush=True)
+            print()
         print("--------------------------------")
+        if CONFIG["translation_cache"]:
+            print(translation_cache.stats())
         
     except KeyboardInterrupt:
         # 处理用户中断（如Ctrl+C）
@@ -183,6 +754,31 @@ async def main():
         print(f"发生错误: {str(e)}")
 
 
+async def benchmark_strategies(text: str = "The quick brown fox jumps over the lazy dog.") -> None:
+    """
+    对比两种翻译引擎在1到5种目标语言下的耗时
+
+    基准测试期间关闭翻译缓存，确保每次都真正调用模型。
+    """
+    all_languages = list(TRANSLATORS)
+    translation_cache.enabled = False
+    try:
+        print(f"{'语言数':<8}{'per_agent(秒)':<16}{'multi_target(秒)':<16}")
+        for count in range(1, len(all_languages) + 1):
+            languages = all_languages[:count]
+            timings = []
+            for strategy in ("per_agent", "multi_target"):
+                start_time = time.perf_counter()
+                await translate(text, languages, strategy=strategy)
+                timings.append(time.perf_counter() - start_time)
+            print(f"{count:<8}{timings[0]:<16.2f}{timings[1]:<16.2f}")
+    finally:
+        translation_cache.enabled = True
+
+
 # 程序入口点，当脚本直接运行时执行
 if __name__ == "__main__":
-    asyncio.run(main())  # 使用asyncio运行异步主函数
+    if "--benchmark" in sys.argv:
+        asyncio.run(benchmark_strategies())  # 对比两种翻译引擎的耗时
+    else:
+        asyncio.run(main())  # 使用asyncio运行异步主函数
@@ -0,0 +1,298 @@
+"""
+LLM as a Judge 循环的离线基准测试工具
+
+用脚本化（或回放录制数据）的模型替身代替真实的Ollama模型，按配置的每token延迟模拟生成耗时，
+按给定的评分序列模拟评估者的结论。可以并发运行大量循环实例，统计迭代次数、token用量、
+耗时及p95，用于在纯CPU、无网络的机器上快速比较循环策略的改动。
+
+用法示例:
+    python judge_benchmark.py --loops 200 --concurrency 50 --verdicts fail,needs_improvement,pass
+    python judge_benchmark.py --loop-state-mode full --candidates 3
+    python judge_benchmark.py --cascade --screening-confidence 0.9
+    python judge_benchmark.py --replay recorded_responses.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import math
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator
+
+from agents import Model, ModelResponse, ModelSettings, ModelTracing, Usage, set_tracing_disabled
+from agents.agent_output import AgentOutputSchema
+from openai.types.responses import Response, ResponseCompletedEvent, ResponseOutputMessage, ResponseOutputText, ResponseUsage
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+import llm_as_a_judge_ollama as judge
+
+# 每个循环实例各自的调用计数，保存在上下文变量中，使并发运行的循环互不干扰
+_loop_state: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar("loop_state")
+
+# 生成模拟大纲时使用的词汇
+OUTLINE_WORDS = [
+    "骑士", "女巫", "王国", "秘密", "迷宫", "巨龙", "预言", "背叛", "友谊", "宝藏",
+    "风暴", "学院", "星舰", "机器人", "侦探", "古城", "誓言", "镜子", "森林", "潮汐",
+]
+
+
+def estimate_tokens(data: Any) -> int:
+    """粗略估算token数：中日韩字符每字1个token，其余字符每4个字符1个token"""
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk) // 4
+
+
+class ScriptedModel(Model):
+    """
+    脚本化的模型替身
+
+    按照角色的脚本返回预设的输出，并按输入和输出的token数模拟预填充和生成的耗时。
+    评估类角色从输入中的"第N次迭代评估"取得迭代序号，其余角色按本循环内的调用次数取脚本中的条目，
+    超出脚本长度时重复最后一条。
+    """
+
+    def __init__(
+        self,
+        role: str,
+        script: list[Any] | None = None,
+        token_latency: float = 0.002,
+        prefill_latency: float = 0.0001,
+        outline_tokens: int = 60,
+    ):
+        """
+        初始化模型替身
+
+        参数:
+            role: 角色名称，例如 generator、evaluator、screening
+            script: 按顺序返回的输出列表；字符串作为文本输出，字典作为结构化输出；为None时生成随机大纲
+            token_latency: 每个输出token的模拟耗时（秒）
+            prefill_latency: 每个输入token的模拟预填充耗时（秒）
+            outline_tokens: 随机大纲的长度（词数）
+        """
+        self.role = role
+        self.script = script
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.outline_tokens = outline_tokens
+
+    def _next_output(self, input: str | list[Any]) -> Any:
+        """取得本次调用对应的脚本输出"""
+        state = _loop_state.get()
+        state["calls"][self.role] += 1
+        index = state["calls"][self.role] - 1
+
+        match = re.search(r"第(\d+)次迭代评估", json.dumps(input, ensure_ascii=False))
+        if match and self.role != "generator":
+            index = int(match.group(1)) - 1
+
+        if self.script:
+            return self.script[min(index, len(self.script) - 1)]
+
+        rng: random.Random = state["rng"]
+        return "，".join(rng.choice(OUTLINE_WORDS) for _ in range(self.outline_tokens))
+
+    async def get_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[Any],
+        model_settings: ModelSettings,
+        tools: list[Any],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Any],
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        output = self._next_output(input)
+        if isinstance(output, dict):
+            # 非Pydantic输出类型（例如dataclass）会被SDK包装在response字段中
+            if output_schema and set(output_schema.json_schema().get("properties", {})) == {"response"}:
+                output = {"response": output}
+            text = json.dumps(output, ensure_ascii=False)
+        else:
+            text = str(output)
+
+        input_tokens = estimate_tokens(system_instructions or "") + estimate_tokens(input)
+        output_tokens = estimate_tokens(text)
+        await asyncio.sleep(input_tokens * self.prefill_latency + output_tokens * self.token_latency)
+
+        message = ResponseOutputMessage(
+            id="scripted",
+            content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+            role="assistant",
+            status="completed",
+            type="message",
+        )
+        usage = Usage(
+            requests=1,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+        )
+        return ModelResponse(output=[message], usage=usage, referenceable_id=None)
+
+    async def stream_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[Any],
+        model_settings: ModelSettings,
+        tools: list[Any],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Any],
+        tracing: ModelTracing,
+    ) -> AsyncIterator[Any]:
+        # 脚本输出没有逐token的增量，流式调用时只发出一个包含完整输出的完成事件，Runner.run_streamed据此得到本轮结果
+        response = await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        )
+        usage = ResponseUsage(
+            input_tokens=response.usage.input_tokens,
+            input_tokens_details=InputTokensDetails(cached_tokens=0),
+            output_tokens=response.usage.output_tokens,
+            output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+            total_tokens=response.usage.total_tokens,
+        )
+        yield ResponseCompletedEvent(
+            type="response.completed",
+            response=Response(
+                id="scripted",
+                created_at=time.time(),
+                model=self.role,
+                object="response",
+                output=response.output,
+                parallel_tool_calls=False,
+                tool_choice="auto",
+                tools=[],
+                usage=usage,
+            ),
+        )
+
+
+def build_scripts(args: argparse.Namespace) -> dict[str, list[Any] | None]:
+    """根据命令行参数构造各角色的脚本，指定--replay时从录制的JSON文件读取"""
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            recorded = json.load(f)
+        return {role: recorded.get(role) for role in ("generator", "evaluator", "screening")}
+
+    verdicts = [verdict.strip() for verdict in args.verdicts.split(",") if verdict.strip()]
+    return {
+        "generator": None,
+        "evaluator": [{"feedback": f"第{i+1}轮意见：加强冲突和人物动机", "score": v} for i, v in enumerate(verdicts)],
+        "screening": [
+            {"feedback": f"第{i+1}轮初筛意见", "score": v, "confidence": args.screening_confidence}
+            for i, v in enumerate(verdicts)
+        ],
+    }
+
+
+def install_scripted_models(args: argparse.Namespace) -> None:
+    """用模型替身替换判别循环中各代理的模型"""
+    scripts = build_scripts(args)
+    common = dict(token_latency=args.token_latency, prefill_latency=args.prefill_latency)
+    judge.story_outline_generator.model = ScriptedModel(
+        "generator", scripts["generator"], outline_tokens=args.outline_tokens, **common
+    )
+    judge.evaluator.model = ScriptedModel("evaluator", scripts["evaluator"], **common)
+    judge.screening_evaluator.model = ScriptedModel("screening", scripts["screening"], **common)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """计算百分位数（最近秩法）"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_benchmark(args: argparse.Namespace) -> list[judge.JudgeLoopResult]:
+    """并发运行多个判别循环实例"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_one(i: int) -> judge.JudgeLoopResult:
+        async with semaphore:
+            _loop_state.set({"calls": defaultdict(int), "rng": random.Random(args.seed + i)})
+            return await judge.run_judge_loop(f"故事请求 #{i}", loop_state_mode=args.loop_state_mode)
+
+    # 循环本身的进度输出对基准测试没有意义，统一屏蔽
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await asyncio.gather(*(run_one(i) for i in range(args.loops)))
+
+
+def report(args: argparse.Namespace, results: list[judge.JudgeLoopResult], wall_time: float) -> None:
+    """打印基准测试结果"""
+    iterations = [r.iterations for r in results]
+    elapsed = [r.elapsed for r in results]
+    tokens = [r.input_tokens + r.output_tokens for r in results]
+    stop_reasons: dict[str, int] = defaultdict(int)
+    for r in results:
+        stop_reasons[r.stop_reason] += 1
+
+    passed = [r.iterations for r in results if r.stop_reason == "pass"]
+    print(f"循环实例: {len(results)}（并发 {args.concurrency}），总耗时 {wall_time:.2f} 秒")
+    print(f"结束原因: {dict(stop_reasons)}")
+    print(f"迭代次数: 平均 {statistics.mean(iterations):.2f}，最多 {max(iterations)}")
+    if passed:
+        print(f"通过所需迭代次数: 平均 {statistics.mean(passed):.2f}")
+    print(
+        f"每个循环的token: 平均 {statistics.mean(tokens):.0f}"
+        f"（输入 {statistics.mean(r.input_tokens for r in results):.0f}，"
+        f"输出 {statistics.mean(r.output_tokens for r in results):.0f}）"
+    )
+    print(
+        f"每个循环耗时: 平均 {statistics.mean(elapsed):.3f} 秒，"
+        f"p50 {percentile(elapsed, 50):.3f} 秒，p95 {percentile(elapsed, 95):.3f} 秒"
+    )
+    print(
+        f"qwq评估调用: 平均 {statistics.mean(r.qwq_calls for r in results):.2f} 次，"
+        f"初筛省下 {sum(r.qwq_calls_avoided for r in results)} 次"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LLM as a Judge 循环的离线基准测试")
+    parser.add_argument("--loops", type=int, default=100, help="运行的循环实例数量")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时运行的循环实例数量")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="每个输出token的模拟耗时（秒）")
+    parser.add_argument("--prefill-latency", type=float, default=0.0001, help="每个输入token的模拟预填充耗时（秒）")
+    parser.add_argument("--outline-tokens", type=int, default=60, help="随机大纲的长度（词数）")
+    parser.add_argument("--verdicts", default="fail,needs_improvement,pass", help="评估者按迭代依次给出的评分，逗号分隔")
+    parser.add_argument("--screening-confidence", type=float, default=0.9, help="初筛评估给出的置信度")
+    parser.add_argument("--replay", help="录制的模型输出JSON文件，包含generator/evaluator/screening三个列表")
+    parser.add_argument("--loop-state-mode", choices=["full", "compact"], default=None, help="循环状态模式")
+    parser.add_argument("--candidates", type=int, default=None, help="每轮候选大纲数量K")
+    parser.add_argument("--cascade", action="store_true", help="开启评估级联（先用快速模型初筛）")
+    parser.add_argument("--no-cache", action="store_true", help="关闭评估缓存")
+    parser.add_argument("--no-convergence", action="store_true", help="关闭收敛检测")
+    parser.add_argument("--seed", type=int, default=0, help="随机大纲的随机种子")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    set_tracing_disabled(True)  # 离线运行，不导出追踪数据
+
+    if args.candidates is not None:
+        judge.CONFIG["candidates_per_round"] = args.candidates
+    if args.cascade:
+        judge.CONFIG["evaluation_cascade"] = True
+    if args.no_cache:
+        judge.CONFIG["evaluation_cache"] = False
+    if args.no_convergence:
+        judge.CONFIG["convergence_check"] = False
+
+    install_scripted_models(args)
+    start_time = time.perf_counter()
+    results = asyncio.run(run_benchmark(args))
+    report(args, results, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    main()
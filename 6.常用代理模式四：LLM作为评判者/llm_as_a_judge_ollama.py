@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import asyncio 
-from dataclasses import dataclass 
-from typing import Literal 
+import difflib
+import hashlib
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Literal 
 
 from openai import AsyncOpenAI  # 导入OpenAI异步客户端，用于与API通信
 from agents import Agent, ItemHelpers, Runner, TResponseInputItem, ModelSettings, OpenAIChatCompletionsModel, set_default_openai_client
@@ -22,6 +26,22 @@ CONFIG = {
     "api_base": "http://localhost:11434/v1",  # Ollama API地址，指向本地运行的Ollama服务
     "timeout": 120.0,  # API超时时间，单位为秒
     "max_iterations": 5,  # 最大迭代次数
+    "convergence_check": True,  # 是否在大纲和反馈不再明显变化时提前结束循环
+    "convergence_metric": "shingle",  # 大纲相似度算法："shingle"字符片段Jaccard相似度，"edit"归一化编辑相似度
+    "outline_similarity_threshold": 0.9,  # 相邻两版大纲相似度达到该值视为大纲不再变化
+    "feedback_similarity_threshold": 0.7,  # 相邻两轮反馈相似度达到该值视为反馈不再变化
+    "convergence_patience": 1,  # 连续多少轮变化可忽略后提前结束
+    "loop_state_mode": "full",  # 循环状态："full"每轮传入完整历史（默认），"compact"只传入原始请求、最新大纲和最新反馈
+    "feedback_digest": True,  # compact模式下是否附带此前评审意见的简短摘要
+    "feedback_digest_chars": 80,  # 摘要中每条历史评审意见保留的最大字符数
+    "candidates_per_round": 1,  # 每轮并发生成的候选大纲数量K，大于1时启用Best-of-K模式
+    "candidate_temperatures": [0.3, 0.7, 1.0],  # Best-of-K模式下各候选依次使用的温度，用于增加候选的多样性
+    "evaluation_cache": True,  # 是否缓存评估结果，相同大纲直接复用之前的评估
+    "evaluation_cache_near_duplicates": True,  # 是否启用基于SimHash的近似重复命中
+    "evaluation_cache_max_distance": 6,  # SimHash（64位）汉明距离不超过该值时视为近似重复的大纲
+    "evaluation_cascade": False,  # 是否先用快速模型初筛，只把边界情况交给qwq复核（默认关闭，每次评估都由qwq完成）
+    "cascade_confidence_threshold": 0.7,  # 初筛置信度低于该值时视为边界情况，交给qwq复核
+    "cascade_escalate_scores": ["pass"],  # 初筛给出这些评分时总是交给qwq确认
 }
 
 # 设置OpenAI兼容的Ollama客户端
@@ -71,18 +91,22 @@ class EvaluationFeedback:
     score: Literal["pass", "needs_improvement", "fail"]  # 评分
 
 
+# 评估者的评分标准，评估者和初筛评估者共用
+EVALUATOR_INSTRUCTIONS = (
+    "你需要评估一个故事大纲并决定它是否足够好。"
+    "评分标准：\n"
+    "- 'fail'：大纲存在重大问题，需要完全重写\n"
+    "- 'needs_improvement'：大纲基本可用，但需要特定改进\n"
+    "- 'pass'：大纲已经足够好\n"
+    "第一次评估时给予'fail'或'needs_improvement'。"
+    "第二次或更多次评估时，如果有明显改进，考虑给予更高评分。"
+)
+
+
 # 代理-2 :创建评估者代理
 evaluator = Agent(
     name="evaluator",
-    instructions=(
-        "你需要评估一个故事大纲并决定它是否足够好。"
-        "评分标准：\n"
-        "- 'fail'：大纲存在重大问题，需要完全重写\n"
-        "- 'needs_improvement'：大纲基本可用，但需要特定改进\n"
-        "- 'pass'：大纲已经足够好\n"
-        "第一次评估时给予'fail'或'needs_improvement'。"
-        "第二次或更多次评估时，如果有明显改进，考虑给予更高评分。"
-    ),
+    instructions=EVALUATOR_INSTRUCTIONS,
     # 指定输出类型为EvaluationFeedback数据类
     output_type=EvaluationFeedback,  
     model=OllamaOpenAIChatCompletionsModel( 
@@ -93,62 +117,551 @@ evaluator = Agent(
 )
 
 
-async def main() -> None:
-    """主函数"""
-    msg = input("你想听什么样的故事？ ")
+@dataclass
+class ScreeningFeedback:
+    """初筛评估的数据结构，在评估反馈之外附带置信度"""
+    feedback: str  # 反馈内容
+    score: Literal["pass", "needs_improvement", "fail"]  # 评分
+    confidence: float  # 对评分的把握程度，范围0到1
+
+
+# 代理-3 :创建初筛评估者代理，使用较快的模型1先给出带置信度的评估
+screening_evaluator = Agent(
+    name="screening_evaluator",
+    instructions=(
+        EVALUATOR_INSTRUCTIONS
+        + "同时给出confidence字段，表示你对评分的把握程度（0到1之间的小数），拿不准时请给出较低的置信度。"
+    ),
+    output_type=ScreeningFeedback,
+    model=OllamaOpenAIChatCompletionsModel(
+        model=CONFIG["model_name_1"],
+        openai_client=qwen_client_1,
+    ),
+    model_settings=ModelSettings(temperature=CONFIG["temperature"]),
+)
+
+
+def shingles(text: str, size: int = 3) -> set[str]:
+    """将文本切分为长度为size的字符片段集合，空白会先被合并"""
+    text = " ".join(text.split())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def text_similarity(a: str, b: str, metric: str = "shingle") -> float:
+    """
+    计算两段文本的相似度，范围为0到1
+
+    参数:
+        a, b: 要比较的文本
+        metric: "shingle"使用字符片段的Jaccard相似度，"edit"使用difflib的归一化编辑相似度
+    """
+    if metric == "edit":
+        return difflib.SequenceMatcher(None, a, b).ratio()
+
+    shingles_a, shingles_b = shingles(a), shingles(b)
+    if not shingles_a and not shingles_b:
+        return 1.0
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """计算文本的SimHash签名，相似文本的签名汉明距离较小"""
+    weights = [0] * bits
+    for shingle in shingles(text):
+        value = int.from_bytes(hashlib.md5(shingle.encode("utf-8")).digest()[:8], "big")
+        for i in range(bits):
+            weights[i] += 1 if (value >> i) & 1 else -1
+    return sum(1 << i for i in range(bits) if weights[i] > 0)
+
+
+class EvaluationCache:
+    """
+    评估结果缓存
+
+    以规范化后的故事请求、大纲和迭代阶段的哈希作为键，完全相同的大纲直接返回之前的EvaluationFeedback；
+    启用近似重复层时，SimHash签名足够接近的大纲也会复用之前的评估。
+    正在进行中的评估也会被登记，Best-of-K同时生成的相同大纲只评估一次，其余候选等待同一个结果。
+    """
+
+    def __init__(self, near_duplicates: bool = True, max_distance: int = 6):
+        """
+        初始化评估缓存
+
+        参数:
+            near_duplicates: 是否启用SimHash近似重复层
+            max_distance: 近似重复允许的最大汉明距离
+        """
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self._exact: dict[str, EvaluationFeedback] = {}
+        self._signatures: dict[str, list[tuple[int, EvaluationFeedback]]] = {}  # 上下文键 -> [(SimHash签名, 评估)]
+        self._inflight: dict[str, list[tuple[str, int, asyncio.Future]]] = {}  # 上下文键 -> [(缓存键, SimHash签名, 进行中的评估)]
+        self.hits = 0  # 完全相同命中次数
+        self.near_hits = 0  # 近似重复命中次数
+        self.inflight_hits = 0  # 等待进行中的评估的次数
+        self.misses = 0  # 未命中次数
+
+    def clear(self) -> None:
+        """清空缓存和统计，例如在对比不同循环模式之间调用，避免后一种模式复用前一种模式的评估"""
+        self._exact.clear()
+        self._signatures.clear()
+        self._inflight.clear()
+        self.hits = self.near_hits = self.inflight_hits = self.misses = 0
+
+    @staticmethod
+    def context_key(msg: str, iteration_count: int) -> str:
+        """迭代上下文：评估者对第一次评估和之后的评估使用不同标准，因此区分这两个阶段"""
+        phase = "first" if iteration_count == 1 else "later"
+        return hashlib.sha256(f"{phase}\n{' '.join(msg.split())}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def outline_key(context: str, outline: str) -> str:
+        """由迭代上下文和规范化后的大纲生成缓存键"""
+        return hashlib.sha256(f"{context}\n{' '.join(outline.split())}".encode("utf-8")).hexdigest()
+
+    def get(self, msg: str, outline: str, iteration_count: int) -> EvaluationFeedback | None:
+        """查找缓存，先查完全相同的大纲，再查近似重复的大纲"""
+        context = self.context_key(msg, iteration_count)
+        cached = self._exact.get(self.outline_key(context, outline))
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        if self.near_duplicates:
+            signature = simhash(outline)
+            for other, feedback in self._signatures.get(context, []):
+                if bin(signature ^ other).count("1") <= self.max_distance:
+                    self.near_hits += 1
+                    return feedback
+
+        self.misses += 1
+        return None
+
+    async def get_or_evaluate(
+        self,
+        msg: str,
+        outline: str,
+        iteration_count: int,
+        evaluate: Callable[[], Awaitable[EvaluationFeedback]],
+    ) -> tuple[EvaluationFeedback, bool]:
+        """
+        查找缓存，未命中时等待进行中的相同（或近似重复）大纲的评估，都没有时调用evaluate并写入缓存
+
+        参数:
+            msg: 故事请求
+            outline: 待评估的大纲
+            iteration_count: 迭代序号
+            evaluate: 实际执行评估的协程函数
+
+        返回:
+            (评估结果, 是否复用了缓存或进行中的评估)
+        """
+        cached = self.get(msg, outline, iteration_count)
+        if cached is not None:
+            return cached, True
+
+        context = self.context_key(msg, iteration_count)
+        key = self.outline_key(context, outline)
+        signature = simhash(outline) if self.near_duplicates else 0
+        for other_key, other_signature, future in self._inflight.get(context, []):
+            if other_key == key or (
+                self.near_duplicates and bin(signature ^ other_signature).count("1") <= self.max_distance
+            ):
+                # get()已经把这次查找计为未命中，改记为等待进行中的评估
+                self.misses -= 1
+                self.inflight_hits += 1
+                return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (key, signature, future)
+        self._inflight.setdefault(context, []).append(entry)
+        try:
+            feedback = await evaluate()
+            self.put(msg, outline, iteration_count, feedback)
+            future.set_result(feedback)
+            return feedback, False
+        except BaseException as e:
+            # 评估失败时等待者得到相同的异常
+            future.set_exception(e if isinstance(e, Exception) else asyncio.CancelledError())
+            future.exception()  # 标记异常已被读取，没有等待者时不产生警告
+            raise
+        finally:
+            self._inflight[context].remove(entry)
+            if not self._inflight[context]:
+                del self._inflight[context]
+
+    def put(self, msg: str, outline: str, iteration_count: int, feedback: EvaluationFeedback) -> None:
+        """写入评估结果"""
+        context = self.context_key(msg, iteration_count)
+        self._exact[self.outline_key(context, outline)] = feedback
+        if self.near_duplicates:
+            self._signatures.setdefault(context, []).append((simhash(outline), feedback))
+
+    def stats(self) -> str:
+        """返回缓存统计信息"""
+        return (
+            f"评估缓存: 完全命中 {self.hits}，近似命中 {self.near_hits}，"
+            f"合并进行中的评估 {self.inflight_hits}，未命中 {self.misses}"
+        )
+
+
+evaluation_cache = EvaluationCache(
+    near_duplicates=CONFIG["evaluation_cache_near_duplicates"],
+    max_distance=CONFIG["evaluation_cache_max_distance"],
+)
+
+
+@dataclass
+class JudgeLoopResult:
+    """评判循环的运行结果"""
+    outline: str | None  # 最终的故事大纲
+    score: str | None  # 最后一次评估的评分
+    iterations: int  # 实际迭代次数
+    elapsed: float  # 总耗时（秒）
+    stop_reason: str  # 结束原因："pass"、"converged" 或 "max_iterations"
+    iteration_times: list[float] = field(default_factory=list)  # 每轮迭代的耗时
+    input_tokens: int = 0  # 所有模型调用的输入token总数
+    output_tokens: int = 0  # 所有模型调用的输出token总数
+    qwq_calls: int = 0  # 调用qwq评估者的次数
+    qwq_calls_avoided: int = 0  # 初筛直接给出结论而省下的qwq调用次数
+
+    @property
+    def iterations_saved(self) -> int:
+        """因提前收敛而省下的迭代次数"""
+        return CONFIG["max_iterations"] - self.iterations if self.stop_reason == "converged" else 0
+
+    @property
+    def time_saved(self) -> float:
+        """按平均每轮耗时估算提前收敛省下的时间（秒）"""
+        if not self.iteration_times:
+            return 0.0
+        return self.iterations_saved * sum(self.iteration_times) / len(self.iteration_times)
+
+
+def feedback_digest(feedback_history: list[str]) -> str:
+    """将此前的评审意见压缩为简短摘要，每条只保留开头部分"""
+    limit = CONFIG["feedback_digest_chars"]
+    points = [f"{i+1}. {feedback[:limit]}{'...' if len(feedback) > limit else ''}" for i, feedback in enumerate(feedback_history)]
+    return "此前的评审要点:\n" + "\n".join(points)
+
+
+def compact_generator_input(
+    msg: str, latest_outline: str | None, feedback_history: list[str]
+) -> list[TResponseInputItem]:
+    """
+    构造compact模式下大纲生成器的输入：原始请求、最新大纲和最新反馈，可选附带历史评审摘要
+    """
+    items: list[TResponseInputItem] = [{"content": msg, "role": "user"}]
+    if latest_outline is None:
+        return items
+
+    items.append({"content": latest_outline, "role": "assistant"})
+    if CONFIG["feedback_digest"] and len(feedback_history) > 1:
+        items.append({"content": feedback_digest(feedback_history[:-1]), "role": "user"})
+    items.append({"content": f"反馈: {feedback_history[-1]}", "role": "user"})
+    return items
+
+
+def add_usage(loop_result: JudgeLoopResult, run_result) -> None:
+    """将一次代理运行中所有模型调用的token用量累加到循环结果中"""
+    for response in run_result.raw_responses:
+        loop_result.input_tokens += response.usage.input_tokens or 0
+        loop_result.output_tokens += response.usage.output_tokens or 0
+
+
+# 评分的优劣顺序，用于在多个候选中挑选最佳大纲
+SCORE_RANK = {"fail": 0, "needs_improvement": 1, "pass": 2}
+
+
+@dataclass
+class Candidate:
+    """一轮迭代中生成并评估过的候选大纲"""
+    outline: str  # 候选大纲文本
+    input_items: list[TResponseInputItem]  # 包含生成器回复的完整输入项，full模式下用于下一轮
+    feedback: EvaluationFeedback  # 评估者对该候选的评估
+    temperature: float | None = None  # 生成该候选时使用的温度
+
+
+async def generate_and_evaluate(
+    msg: str,
+    generator_input: list[TResponseInputItem],
+    iteration_count: int,
+    loop_state_mode: str,
+    loop_result: JudgeLoopResult,
+    temperature: float | None = None,
+) -> Candidate:
+    """
+    生成一版故事大纲并交给评估者评估
+
+    参数:
+        msg: 用户想听的故事描述
+        generator_input: 大纲生成器的输入项
+        iteration_count: 当前迭代次数
+        loop_state_mode: "full" 或 "compact"
+        loop_result: 用于累加token用量的循环结果
+        temperature: 生成大纲使用的温度，为None时使用生成器默认设置
+    """
+    generator = story_outline_generator
+    if temperature is not None:
+        generator = story_outline_generator.clone(model_settings=ModelSettings(temperature=temperature))
+
+    # 运行故事大纲生成器代理
+    story_outline_result = await Runner.run(
+        generator,  # 使用故事大纲生成器代理
+        generator_input,  # 传入当前的输入项列表
+    )
+    add_usage(loop_result, story_outline_result)
+
+    # 获取最新生成的故事大纲文本
+    # 一个辅助函数，用于从这些消息项中提取纯文本内容
+    outline = ItemHelpers.text_message_outputs(story_outline_result.new_items)
+    input_items = story_outline_result.to_input_list()
+    print("故事大纲已生成")  # 打印状态信息
+
+    # 运行评估者代理评估故事大纲：评估者看到生成器的输入和新大纲。
+    # compact模式下生成器的输入只有原始请求、上一版大纲和最新反馈，评估者据此判断新大纲是否有明显改进
+    evaluator_input = input_items
+
+    async def evaluate() -> EvaluationFeedback:
+        return await evaluate_outline(
+            evaluator_input + [{"content": f"这是第{iteration_count}次迭代评估", "role": "system"}],
+            loop_result,
+        )
+
+    if not CONFIG["evaluation_cache"]:
+        return Candidate(outline, input_items, await evaluate(), temperature)
+
+    # 相同或近似重复的大纲（包括同一轮中正在评估的其他候选）直接复用评估结果
+    feedback, reused = await evaluation_cache.get_or_evaluate(msg, outline, iteration_count, evaluate)
+    if reused:
+        print("评估缓存命中，跳过评估")
+    return Candidate(outline, input_items, feedback, temperature)
+
+
+async def evaluate_outline(evaluator_input: list[TResponseInputItem], loop_result: JudgeLoopResult) -> EvaluationFeedback:
+    """
+    评估故事大纲
+
+    启用评估级联时，先由模型1给出带置信度的初筛评估：置信度足够高且不是"pass"的结论直接采用，
+    只有"pass"或置信度低的边界情况才交给qwq确认。
+
+    参数:
+        evaluator_input: 评估者的输入项
+        loop_result: 用于累加token用量和qwq调用统计的循环结果
+    """
+    if CONFIG["evaluation_cascade"]:
+        try:
+            screening_result = await Runner.run(screening_evaluator, evaluator_input)
+            add_usage(loop_result, screening_result)
+            screening: ScreeningFeedback = screening_result.final_output
+            print(f"初筛评分: {screening.score}（置信度 {screening.confidence:.2f}）")
+
+            if (
+                screening.score not in CONFIG["cascade_escalate_scores"]
+                and screening.confidence >= CONFIG["cascade_confidence_threshold"]
+            ):
+                loop_result.qwq_calls_avoided += 1
+                return EvaluationFeedback(feedback=screening.feedback, score=screening.score)
+        except Exception as e:
+            # 初筛失败时直接交给qwq评估
+            print(f"初筛评估失败: {str(e)}")
+
+    evaluator_result = await Runner.run(evaluator, evaluator_input)
+    add_usage(loop_result, evaluator_result)
+    loop_result.qwq_calls += 1
+    return evaluator_result.final_output
+
+
+async def best_of_k(
+    msg: str,
+    generator_input: list[TResponseInputItem],
+    iteration_count: int,
+    loop_state_mode: str,
+    loop_result: JudgeLoopResult,
+    k: int,
+) -> Candidate:
+    """
+    并发生成并评估K个候选大纲，返回评分最高的候选
+
+    各候选使用不同的温度以增加多样性。任一候选被评为"pass"时立即取消其余候选并返回；
+    否则按评分挑选最佳候选，评分相同时取温度序号靠前的候选。
+    """
+    temperatures = CONFIG["candidate_temperatures"]
+    tasks = [
+        asyncio.create_task(
+            generate_and_evaluate(
+                msg, generator_input, iteration_count, loop_state_mode, loop_result, temperatures[i % len(temperatures)]
+            )
+        )
+        for i in range(k)
+    ]
+
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                candidate = await finished
+            except Exception as e:
+                print(f"候选大纲生成失败: {str(e)}")
+                continue
+            if candidate.feedback.score == "pass":
+                return candidate  # 其余候选在finally中取消
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    candidates = [task.result() for task in tasks if not task.cancelled() and task.exception() is None]
+    if not candidates:
+        raise RuntimeError("本轮所有候选大纲都生成失败")
+    return max(candidates, key=lambda candidate: SCORE_RANK.get(candidate.feedback.score, 0))
+
+
+async def run_judge_loop(msg: str, loop_state_mode: str | None = None) -> JudgeLoopResult:
+    """
+    运行"生成大纲-评估-改进"循环
+
+    循环在评分为"pass"、达到最大迭代次数，或启用收敛检测且大纲与反馈连续多轮几乎不再变化时结束。
+    candidates_per_round大于1时，每轮并发生成K个候选，从评分最高的候选继续下一轮。
+
+    参数:
+        msg: 用户想听的故事描述
+        loop_state_mode: "full" 或 "compact"，默认使用CONFIG中的配置。
+            full模式下两个代理每轮都重新读取所有历史大纲和评审意见，预填充开销随迭代次数二次增长；
+            compact模式下只传入原始请求、最新大纲和最新反馈，评估者额外看到本轮生成的新大纲。
+    """
+    loop_state_mode = loop_state_mode or CONFIG["loop_state_mode"]
+
     # 创建输入项列表，包含用户消息
     input_items: list[TResponseInputItem] = [{"content": msg, "role": "user"}]
 
     # 初始化最新的故事大纲变量
     latest_outline: str | None = None
+    previous_outline: str | None = None
+    previous_feedback: str | None = None
+    feedback_history: list[str] = []  # 历次评审意见
+    stable_rounds = 0  # 连续变化可忽略的轮数
+    result: EvaluationFeedback | None = None
+    loop_result = JudgeLoopResult(outline=None, score=None, iterations=0, elapsed=0.0, stop_reason="")
 
     # 初始化迭代计数器
     iteration_count = 0
+    iteration_times: list[float] = []
+    start_time = time.perf_counter()
 
     while True:
         # 增加迭代计数
         iteration_count += 1
+        iteration_start = time.perf_counter()
 
-        # 第1步：运行故事大纲生成器代理
-        story_outline_result = await Runner.run(
-            story_outline_generator,  # 使用故事大纲生成器代理
-            input_items,  # 传入当前的输入项列表
-        )
+        # 第1步：生成故事大纲并评估；Best-of-K模式下并发生成多个候选
+        if loop_state_mode == "compact":
+            input_items = compact_generator_input(msg, latest_outline, feedback_history)
+        if CONFIG["candidates_per_round"] > 1:
+            candidate = await best_of_k(
+                msg, input_items, iteration_count, loop_state_mode, loop_result, CONFIG["candidates_per_round"]
+            )
+            print(f"本轮选用温度为 {candidate.temperature} 的候选大纲")
+        else:
+            candidate = await generate_and_evaluate(msg, input_items, iteration_count, loop_state_mode, loop_result)
 
-        # 第2步：更新输入项列表，包含大纲生成器的响应
-        input_items = story_outline_result.to_input_list()
-        # 获取最新生成的故事大纲文本
-        # 一个辅助函数，用于从这些消息项中提取纯文本内容
-        latest_outline = ItemHelpers.text_message_outputs(story_outline_result.new_items)
-        print("故事大纲已生成")  # 打印状态信息
-
-        # 第3步：运行评估者代理评估故事大纲
-        evaluator_result = await Runner.run(
-            evaluator, 
-            input_items + [{"content": f"这是第{iteration_count}次迭代评估", "role": "system"}]
-        )
-        
-        # 第4步：获取评估结果
-        result: EvaluationFeedback = evaluator_result.final_output
+        # 第2步：从选中的候选继续，更新输入项列表和最新的故事大纲
+        input_items = candidate.input_items
+        latest_outline = candidate.outline
+
+        # 第3步：获取评估结果
+        result = candidate.feedback
+        feedback_history.append(result.feedback)
+        iteration_times.append(time.perf_counter() - iteration_start)
 
         # 打印评估分数
         print(f"评估者评分: {result.score}")
 
-        # 第5步：如果评分为"pass"或已达到最大迭代次数，则跳出循环
+        # 第4步：如果评分为"pass"或已达到最大迭代次数，则跳出循环
         if result.score == "pass":
             print("故事大纲已足够好，退出。")
+            stop_reason = "pass"
             break
         elif iteration_count >= CONFIG["max_iterations"]:
             print(f"已达到最大迭代次数 {CONFIG['max_iterations']}，退出循环。")
+            stop_reason = "max_iterations"
             break
 
+        # 第5步：收敛检测，比较相邻两版大纲和相邻两轮反馈的变化
+        if CONFIG["convergence_check"] and previous_outline is not None:
+            outline_similarity = text_similarity(previous_outline, latest_outline, CONFIG["convergence_metric"])
+            feedback_similarity = text_similarity(previous_feedback or "", result.feedback, CONFIG["convergence_metric"])
+            print(f"大纲相似度: {outline_similarity:.2f}，反馈相似度: {feedback_similarity:.2f}")
+
+            if (
+                outline_similarity >= CONFIG["outline_similarity_threshold"]
+                and feedback_similarity >= CONFIG["feedback_similarity_threshold"]
+            ):
+                stable_rounds += 1
+            else:
+                stable_rounds = 0
+
+            if stable_rounds >= CONFIG["convergence_patience"]:
+                print("大纲和反馈已不再明显变化，提前结束循环。")
+                stop_reason = "converged"
+                break
+        previous_outline, previous_feedback = latest_outline, result.feedback
+
         # 第6步：将评估反馈添加到输入项列表，供下一轮故事大纲生成使用
         input_items.append({"content": f"反馈: {result.feedback}", "role": "user"})
 
+    loop_result.outline = latest_outline
+    loop_result.score = result.score if result else None
+    loop_result.iterations = iteration_count
+    loop_result.elapsed = time.perf_counter() - start_time
+    loop_result.stop_reason = stop_reason
+    loop_result.iteration_times = iteration_times
+    return loop_result
+
+
+async def main() -> None:
+    """主函数"""
+    msg = input("你想听什么样的故事？ ")
+    loop_result = await run_judge_loop(msg)
+
     # 打印最终的故事大纲
-    print(f"最终故事大纲: {latest_outline}")
+    print(f"最终故事大纲: {loop_result.outline}")
+    print(f"共迭代 {loop_result.iterations} 次，耗时 {loop_result.elapsed:.1f} 秒")
+    print(f"输入token: {loop_result.input_tokens}，输出token: {loop_result.output_tokens}")
+    if CONFIG["evaluation_cache"]:
+        print(evaluation_cache.stats())
+    if CONFIG["evaluation_cascade"]:
+        print(f"qwq评估调用 {loop_result.qwq_calls} 次，初筛省下 {loop_result.qwq_calls_avoided} 次")
+    if loop_result.stop_reason == "converged":
+        print(
+            f"提前收敛节省了 {loop_result.iterations_saved} 次迭代，"
+            f"约 {loop_result.time_saved:.1f} 秒"
+        )
+
+
+async def compare_loop_state_modes() -> None:
+    """用同一个故事请求分别运行full和compact两种循环状态，对比token用量、迭代次数和耗时"""
+    msg = input("你想听什么样的故事？ ")
+    rows = []
+    for mode in ("full", "compact"):
+        print(f"\n===== 循环状态: {mode} =====")
+        # 每种模式从空缓存开始，避免后一种模式复用前一种模式的评估而影响对比
+        evaluation_cache.clear()
+        loop_result = await run_judge_loop(msg, loop_state_mode=mode)
+        rows.append((mode, loop_result))
+
+    print(f"\n{'模式':<10}{'迭代次数':<10}{'结束原因':<16}{'输入token':<12}{'输出token':<12}{'耗时(秒)':<10}")
+    for mode, loop_result in rows:
+        print(
+            f"{mode:<10}{loop_result.iterations:<10}{loop_result.stop_reason:<16}"
+            f"{loop_result.input_tokens:<12}{loop_result.output_tokens:<12}{loop_result.elapsed:<10.1f}"
+        )
 
 
 # 程序入口
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--compare" in sys.argv:
+        asyncio.run(compare_loop_state_modes())  # 对比两种循环状态
+    else:
+        asyncio.run(main())
@@ -1,9 +1,15 @@
 import asyncio
+import re
+import string
+import sys
+import time
+import unicodedata
+from collections import deque
 from openai import AsyncOpenAI  # 导入OpenAI异步客户端，用于与Ollama通信
 from agents import Agent, ItemHelpers, Runner, ModelSettings, OpenAIChatCompletionsModel
 from openai.types.responses import ResponseTextDeltaEvent 
 """
-该示例展示了并行化模式。我们并行运行代理三次，并选择最佳结果。
+该示例展示了并行化模式。我们并行运行代理多次（默认三次），并选择最佳结果。
 这种模式可以让模型生成多个翻译版本，然后从中选择最优的一个。
 """
 
@@ -15,6 +21,14 @@ CONFIG = {
     "api_base": "http://localhost:11434/v1",  # Ollama API地址，指向本地运行的Ollama服务
     "timeout": 120.0,  # API超时时间，单位为秒
     "max_iterations": 5,  # 最大迭代次数
+    "num_replicas": 3,  # 并行运行的翻译代理副本数量N
+    "first_k": None,  # None：等待全部副本；设为小于num_replicas的K时只等待最先完成的K个结果，其余副本被取消并中止对应的Ollama请求
+    "replica_timeout": 60.0,  # 单个副本的超时时间（秒），超时的副本被视为失败
+    "consensus_picker": True,  # 是否先在本地按候选之间的一致程度选择翻译，一致时跳过选择代理
+    "consensus_threshold": 0.7,  # 中心候选与其余候选的平均相似度达到该值时直接采用，不再调用选择代理
+    "consensus_ngram": 3,  # 计算相似度时使用的字符n-gram长度
+    "batch_window": 4,  # 批量模式下同时处理中的句子数量上限
+    "max_inflight_requests": 6,  # 同时发往Ollama的请求数量上限
 }
 
 # 设置OpenAI兼容的Ollama客户端
@@ -63,7 +77,11 @@ english_agent = Agent(
 # 这个代理的任务是从多个翻译结果中选择最佳的一个
 translation_picker = Agent(
     name="translation_picker",  # 代理名称
-    instructions="请从给出的选项中选择最佳的英语翻译", 
+    instructions=(
+        "请从给出的选项中选择最佳的英语翻译。"
+        "每个选项以[A]、[B]这样的标签开头。"
+        "回复的第一行必须写成'选择: 标签'，例如'选择: A'，然后另起一行给出该翻译。"
+    ),
     model=OllamaOpenAIChatCompletionsModel( 
         model=CONFIG["model_name_2"], 
         openai_client=qwen_client_2, 
@@ -71,59 +89,323 @@ translation_picker = Agent(
     model_settings=ModelSettings(temperature=CONFIG["temperature"]), 
 )
 
+# 限制同时发往Ollama的请求数量，批量模式下多个句子共享这一上限
+ollama_semaphore = asyncio.Semaphore(CONFIG["max_inflight_requests"])
+
+
+async def run_replica(msg: str, timeout: float) -> str:
+    """运行一个翻译代理副本，超过timeout秒未完成时抛出asyncio.TimeoutError（排队等待的时间不计入超时）"""
+    async with ollama_semaphore:
+        result = await asyncio.wait_for(Runner.run(english_agent, msg), timeout=timeout)
+    # 从代理结果中提取文本消息输出
+    return ItemHelpers.text_message_outputs(result.new_items)
+
+
+async def run_replicas(msg: str, num_replicas: int, first_k: int | None, timeout: float) -> list[str]:
+    """
+    并行运行N个翻译代理副本，采用"N取前K"的完成策略
+
+    最先成功完成的K个副本的结果会被返回，其余仍在运行的副本立即被取消；
+    取消任务会关闭对应的HTTP连接，Ollama随之中止这些请求的生成。
+    失败或超时的副本不计入K，因此尾部延迟由较快的副本决定。
+
+    参数:
+        msg: 待翻译的消息
+        num_replicas: 副本数量N
+        first_k: 需要等待的结果数量K，为None时等待全部副本
+        timeout: 单个副本的超时时间（秒）
+
+    返回:
+        按完成顺序排列的翻译结果，最多K个
+    """
+    first_k = num_replicas if first_k is None else max(1, min(first_k, num_replicas))
+    tasks = [asyncio.create_task(run_replica(msg, timeout)) for _ in range(num_replicas)]
+    outputs: list[str] = []
+
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                outputs.append(await finished)
+            except asyncio.TimeoutError:
+                print("一个翻译副本超时，已跳过", file=sys.stderr)
+                continue
+            except Exception as e:
+                print(f"一个翻译副本出错: {str(e)}，已跳过", file=sys.stderr)
+                continue
+            if len(outputs) >= first_k:
+                break
+    finally:
+        # 取消仍在运行的副本，中止对应的Ollama请求
+        stragglers = [task for task in tasks if not task.done()]
+        for task in stragglers:
+            task.cancel()
+        await asyncio.gather(*stragglers, return_exceptions=True)
+        if stragglers:
+            print(f"已取消 {len(stragglers)} 个较慢的翻译副本", file=sys.stderr)
+
+    return outputs
+
+
+# 本地共识选择的统计：跳过和调用选择代理的次数
+picker_stats = {"skipped": 0, "invoked": 0}
+
+
+def char_ngrams(text: str, n: int) -> set[str]:
+    """将文本规范化（小写、合并空白）后切分为字符n-gram集合"""
+    text = " ".join(text.lower().split())
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def medoid(outputs: list[str], n: int = 3) -> tuple[str, float]:
+    """
+    计算每个候选与其余候选的平均字符n-gram Jaccard相似度，返回平均相似度最高的中心候选（medoid）
+
+    返回:
+        (中心候选, 平均相似度)
+    """
+    if len(outputs) == 1:
+        return outputs[0], 1.0
+
+    grams = [char_ngrams(output, n) for output in outputs]
+    best_index, best_score = 0, -1.0
+    for i, grams_i in enumerate(grams):
+        similarities = []
+        for j, grams_j in enumerate(grams):
+            if i == j:
+                continue
+            union = grams_i | grams_j
+            similarities.append(len(grams_i & grams_j) / len(union) if union else 1.0)
+        score = sum(similarities) / len(similarities)
+        if score > best_score:
+            best_index, best_score = i, score
+    return outputs[best_index], best_score
+
+
+def consensus_choice(outputs: list[str], threshold: float, n: int = 3) -> tuple[str, float] | None:
+    """
+    按候选之间的一致程度在本地选择翻译
+
+    取中心候选（medoid），其平均相似度达到阈值时说明候选基本一致，直接返回它；否则返回None，交给选择代理判断。
+
+    返回:
+        (选中的翻译, 平均相似度) 或 None
+    """
+    translation, agreement = medoid(outputs, n)
+    if agreement >= threshold:
+        return translation, agreement
+    return None
+
+
+def normalize_candidate(text: str) -> str:
+    """规范化候选翻译：统一Unicode形式、转为小写、去掉标点并合并空白，用于识别重复候选"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("P"))
+    return " ".join(text.split())
+
+
+def deduplicate_candidates(outputs: list[str]) -> list[tuple[str, str, list[int]]]:
+    """
+    合并完全相同以及仅在空白、标点上不同的候选翻译，并为剩余候选分配简短标签
+
+    返回:
+        [(标签, 候选翻译, 对应的副本序号列表)]，副本序号从1开始
+    """
+    groups: dict[str, tuple[str, list[int]]] = {}
+    for replica, output in enumerate(outputs, start=1):
+        key = normalize_candidate(output)
+        if key in groups:
+            groups[key][1].append(replica)
+        else:
+            groups[key] = (output.strip(), [replica])
+    return [
+        (string.ascii_uppercase[i % 26] + (str(i // 26) if i >= 26 else ""), text, replicas)
+        for i, (text, replicas) in enumerate(groups.values())
+    ]
+
+
+def format_candidates(candidates: list[tuple[str, str, list[int]]]) -> str:
+    """将去重后的候选整理为选择代理的输入，每个候选只出现一次"""
+    return "\n".join(f"[{label}] {text}" for label, text, _ in candidates)
+
+
+def map_choice_to_replicas(picker_output: str, candidates: list[tuple[str, str, list[int]]]) -> tuple[str, str, list[int]] | None:
+    """从选择代理的输出中解析所选标签，映射回对应的候选和副本"""
+    match = re.search(r"(?:选择|choice)\s*[:：]\s*\[?([A-Z]\d*)\]?", picker_output, re.I)
+    if not match:
+        return None
+    label = match.group(1).upper()
+    for candidate in candidates:
+        if candidate[0] == label:
+            return candidate
+    return None
+
+
+async def translate_sentence(msg: str) -> str:
+    """
+    翻译一句话并返回最终译文，供批量模式使用
+
+    流程与交互模式相同：并行运行翻译副本，候选一致时采用本地共识结果，否则调用选择代理（非流式）；
+    选择代理出错或输出无法解析时采用中心候选，单个句子的失败不会中断整个批量任务。
+    所有副本都失败或超时时返回空字符串（输出中保留空行以对齐输入行），并在标准错误中记录失败的句子。
+    诊断信息都写到标准错误，不会混入写到标准输出的译文。
+    """
+    outputs = await run_replicas(msg, CONFIG["num_replicas"], CONFIG["first_k"], CONFIG["replica_timeout"])
+    if not outputs:
+        print(f"所有翻译副本都失败或超时，未能翻译: {msg}", file=sys.stderr)
+        return ""
+
+    consensus = None
+    if CONFIG["consensus_picker"]:
+        consensus = consensus_choice(outputs, CONFIG["consensus_threshold"], CONFIG["consensus_ngram"])
+    if consensus:
+        picker_stats["skipped"] += 1
+        return consensus[0].strip()
+
+    candidates = deduplicate_candidates(outputs)
+    if len(candidates) == 1:
+        # 去重后只剩一个候选，无需选择
+        picker_stats["skipped"] += 1
+        return candidates[0][1]
+
+    # 选择代理失败或输出无法解析时，退回到本地的中心候选
+    fallback = medoid(outputs, CONFIG["consensus_ngram"])[0].strip()
+    picker_stats["invoked"] += 1
+    try:
+        async with ollama_semaphore:
+            result = await Runner.run(
+                translation_picker,
+                f"输入文本: {msg}\n\n翻译结果:\n{format_candidates(candidates)}",
+            )
+    except Exception as e:
+        print(f"选择代理出错: {str(e)}，改用中心候选: {msg}", file=sys.stderr)
+        return fallback
+    chosen = map_choice_to_replicas(str(result.final_output), candidates)
+    if chosen:
+        return chosen[1]
+    # 无法解析所选标签时不使用选择代理的原始输出（可能包含思考过程），改用中心候选
+    print(f"无法解析选择代理的输出，改用中心候选: {msg}", file=sys.stderr)
+    return fallback
+
+
+async def translate_batch(input_path: str, output_path: str | None = None) -> None:
+    """
+    批量翻译文件中的每一行
+
+    逐行读取输入，最多同时处理batch_window个句子：句子i的选择阶段与句子i+1的翻译副本同时进行，
+    所有句子共享同一个Ollama请求数量上限。结果按输入顺序写出，最后报告吞吐量。
+
+    参数:
+        input_path: 输入文件，每行一句
+        output_path: 输出文件，为None时打印到终端
+    """
+    window: deque[tuple[str, asyncio.Task]] = deque()
+    translated = 0
+    failed = 0
+    start_time = time.perf_counter()
+    out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+
+    async def emit_oldest() -> None:
+        nonlocal translated, failed
+        line, task = window.popleft()
+        translation = await task
+        out.write(translation + "\n")
+        out.flush()
+        translated += 1
+        if line and not translation:
+            failed += 1
+
+    try:
+        with open(input_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    window.append((line, asyncio.create_task(translate_sentence(line))))
+                else:
+                    window.append((line, asyncio.create_task(asyncio.sleep(0, result=""))))  # 保留空行
+                # 窗口已满时按顺序写出最早的句子，保持处理中的句子数量有界
+                if len(window) >= CONFIG["batch_window"]:
+                    await emit_oldest()
+        while window:
+            await emit_oldest()
+    finally:
+        for _, task in window:
+            task.cancel()
+        if output_path:
+            out.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"\n共翻译 {translated} 行（失败 {failed} 行），耗时 {elapsed:.1f} 秒，吞吐量 {translated / elapsed if elapsed else 0:.2f} 句/秒，"
+        f"选择代理跳过 {picker_stats['skipped']}/{picker_stats['skipped'] + picker_stats['invoked']} 次",
+        file=sys.stderr,
+    )
+
+
 async def main():
     """
     主函数，包含程序的主要逻辑流程：
     1. 获取用户输入
-    2. 并行运行三个翻译代理
+    2. 并行运行N个翻译代理副本，取最先完成的K个结果
     3. 使用选择代理选出最佳翻译
     4. 输出结果
     """
     # 1. 获取用户输入的消息
     msg = input("你好！请输入一句消息，我们将把它翻译成英语。\n\n")
 
-    # 使用asyncio.gather并行运行三个翻译代理
-    # 这样可以同时获得三个不同的翻译版本
-    res_1, res_2, res_3 = await asyncio.gather(
-        Runner.run(
-            english_agent,
-            msg,
-        ),
-        Runner.run(
-            english_agent,
-            msg,
-        ),
-        Runner.run(
-            english_agent,
-            msg,
-        ),
-    )
-
-    # 从代理结果中提取文本消息输出
-    outputs = [
-        ItemHelpers.text_message_outputs(res_1.new_items),  # 提取第一个代理的文本输出
-        ItemHelpers.text_message_outputs(res_2.new_items),  # 提取第二个代理的文本输出
-        ItemHelpers.text_message_outputs(res_3.new_items),  # 提取第三个代理的文本输出
-    ]
+    # 并行运行N个翻译代理副本，只等待最先完成的K个结果
+    outputs = await run_replicas(msg, CONFIG["num_replicas"], CONFIG["first_k"], CONFIG["replica_timeout"])
+    if not outputs:
+        print("所有翻译副本都失败或超时，请稍后重试。")
+        return
 
     # 将所有翻译结果合并成一个字符串，用于展示和选择
     translations = "\n\n".join(outputs)
     print(f"\n\n多个代理的多种翻译结果：\n\n{translations}")
 
-    # 运行翻译选择代理，从多个翻译中选出最佳的一个
-    best_translation = Runner.run_streamed(
-        translation_picker,  # 使用选择代理
-        f"输入文本: {msg}\n\n翻译结果:\n{translations}", 
-    )
+    # 候选基本一致时，直接采用本地共识结果，跳过选择代理
+    consensus = None
+    if CONFIG["consensus_picker"]:
+        consensus = consensus_choice(outputs, CONFIG["consensus_threshold"], CONFIG["consensus_ngram"])
+    if consensus:
+        translation, agreement = consensus
+        picker_stats["skipped"] += 1
+        print(f"\n\n候选翻译基本一致（平均相似度 {agreement:.2f}），跳过选择代理：\n\n{translation}")
+    else:
+        picker_stats["invoked"] += 1
+        # 合并重复候选并用简短标签标注，减少选择代理需要预填充的内容
+        candidates = deduplicate_candidates(outputs)
+        print(f"\n\n去重后剩余 {len(candidates)}/{len(outputs)} 个候选翻译")
+
+        # 运行翻译选择代理，从多个翻译中选出最佳的一个
+        best_translation = Runner.run_streamed(
+            translation_picker,  # 使用选择代理
+            f"输入文本: {msg}\n\n翻译结果:\n{format_candidates(candidates)}", 
+        )
+
+        # 处理流式输出
+        picker_output = ""
+        async for event in best_translation.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                picker_output += event.data.delta
+                print(event.data.delta, end="", flush=True)
 
-    # 处理流式输出
-    async for event in best_translation.stream_events():
-        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            print(event.data.delta, end="", flush=True)
+        # 将选择代理的结论映射回对应的副本
+        chosen = map_choice_to_replicas(picker_output, candidates)
+        if chosen:
+            label, translation, replicas = chosen
+            print(f"\n\n选中候选 [{label}]，来自副本 {'、'.join(str(replica) for replica in replicas)}")
 
+    total = picker_stats["skipped"] + picker_stats["invoked"]
+    print(f"\n\n选择代理跳过率: {picker_stats['skipped']}/{total}")
     print("\n\n-----")
 
 
 
 if __name__ == "__main__":
-    asyncio.run(main())  
+    if len(sys.argv) >= 3 and sys.argv[1] == "--batch":
+        # 批量模式: python parallelization_ollama.py --batch 输入文件 [输出文件]
+        asyncio.run(translate_batch(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
+    else:
+        asyncio.run(main())  
@@ -0,0 +1,69 @@
+# Agent used to summarise the results of several searches in a single model call.
+from pydantic import BaseModel
+from openai import AsyncOpenAI
+from agents import Agent, ModelSettings, OpenAIChatCompletionsModel
+
+from .search_cache import cache_key, normalize_query
+
+# 定义要使用的Ollama模型名称
+MODEL_NAME = "qwq:latest"
+
+# 设置OpenAI兼容的Ollama客户端
+# 创建一个AsyncOpenAI客户端实例，但连接到本地Ollama服务器
+external_client = AsyncOpenAI(
+    api_key="qwq",
+    base_url="http://localhost:11434/v1",  # 指向本地Ollama服务的端口
+    timeout=300.0,  # 增加超时时间
+    max_retries=3,  # 添加重试机制
+)
+
+INSTRUCTIONS = (
+    "你是一个研究助手。你将获得若干条带编号的搜索词及其浏览器搜索结果片段。"
+    "请为每一条搜索分别写一段简明摘要，少于300字，捕捉主要观点，忽略无关内容，不需要完整的句子或良好的语法。"
+    "每条摘要只能基于对应编号的搜索结果。输出时保留原编号，每个编号输出一条摘要，不要遗漏也不要合并。"
+)
+
+
+class SearchSummary(BaseModel):
+    index: int
+    """搜索的编号"""
+
+    summary: str
+    """该搜索结果的摘要"""
+
+
+class BatchSummaries(BaseModel):
+    summaries: list[SearchSummary]
+    """每条搜索的摘要"""
+
+
+# 创建批量摘要代理
+batch_summarizer_agent = Agent(
+    name="BatchSummarizerAgent",
+    instructions=INSTRUCTIONS,
+    model=OpenAIChatCompletionsModel(
+        model=MODEL_NAME,  # 使用本地Ollama模型
+        openai_client=external_client,
+    ),
+    model_settings=ModelSettings(temperature=0.3),
+    output_type=BatchSummaries,  # 指定输出类型为BatchSummaries
+)
+
+
+def format_batch_input(searches: list[tuple[str, str]]) -> str:
+    """
+    把多条搜索结果拼成批量摘要代理的输入
+
+    参数:
+        searches: (搜索词, 搜索结果) 列表，编号从1开始
+
+    返回:
+        str: 代理输入文本
+    """
+    blocks = [f"[{i}] 搜索词: {query}\n搜索结果:\n{result}" for i, (query, result) in enumerate(searches, 1)]
+    return "\n\n".join(blocks)
+
+
+def batch_summary_key(search_query: str, search_result: str) -> str:
+    """批量摘要缓存的键：批量摘要代理的指令、规范化的查询词和搜索结果"""
+    return cache_key(INSTRUCTIONS, normalize_query(search_query), search_result)
@@ -1,9 +1,11 @@
 import asyncio 
  # 导入base64库，用于编码/解码
 import base64 
+from dataclasses import dataclass
 from typing import Literal, Union 
+from urllib.parse import urlparse
 # 导入Playwright异步API
-from playwright.async_api import Browser, Page, Playwright, async_playwright  
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, Route, async_playwright  
 # 从agents模块导入必要的类和类型
 from agents import AsyncComputer, Button, Environment  
 
@@ -37,20 +39,119 @@ CUA_KEY_TO_PLAYWRIGHT_KEY = {
 }
 
 
+@dataclass(frozen=True)
+class LaunchProfile:
+    """浏览器启动配置：是否无头运行，以及要在网络层拦截的请求"""
+
+    headless: bool = False
+    """是否以无头模式启动浏览器"""
+
+    blocked_resource_types: tuple[str, ...] = ()
+    """按资源类型拦截的请求，例如image、font、stylesheet、media"""
+
+    blocked_domains: tuple[str, ...] = ()
+    """按域名拦截的请求，匹配该域名及其子域名"""
+
+    @property
+    def filters_requests(self) -> bool:
+        """是否需要安装请求拦截"""
+        return bool(self.blocked_resource_types or self.blocked_domains)
+
+
+# 交互式使用：有界面、加载全部资源（原有行为）
+INTERACTIVE_PROFILE = LaunchProfile()
+
+# 搜索工具使用：无头模式，拦截提取搜索摘要用不到的图片、字体、样式表、媒体以及常见的统计追踪域名
+SEARCH_PROFILE = LaunchProfile(
+    headless=True,
+    blocked_resource_types=("image", "media", "font", "stylesheet"),
+    blocked_domains=(
+        "bat.bing.com",
+        "clarity.ms",
+        "doubleclick.net",
+        "google-analytics.com",
+        "googletagmanager.com",
+        "scorecardresearch.com",
+    ),
+)
+
+# 通过Performance API统计页面加载耗时和传输字节数
+PAGE_METRICS_SCRIPT = """() => {
+    const nav = performance.getEntriesByType('navigation').pop();
+    const resources = performance.getEntriesByType('resource');
+    const resourceBytes = resources.reduce((sum, r) => sum + (r.transferSize || 0), 0);
+    const loadEnd = nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) : 0;
+    return {
+        load_ms: nav ? Math.max(0, loadEnd - nav.startTime) : 0,
+        transfer_bytes: (nav ? nav.transferSize || 0 : 0) + resourceBytes,
+        resources: resources.length,
+    };
+}"""
+
+
+async def install_request_filter(target: Union[Page, BrowserContext], profile: LaunchProfile) -> dict[str, int]:
+    """
+    在页面或浏览器上下文上安装请求拦截，按资源类型和域名黑名单中止请求
+
+    参数:
+        target: 页面或浏览器上下文
+        profile: 启动配置
+
+    返回:
+        dict: 拦截统计，包含blocked和allowed两个计数，随请求实时更新
+    """
+    stats = {"blocked": 0, "allowed": 0}
+    if not profile.filters_requests:
+        return stats
+
+    blocked_types = set(profile.blocked_resource_types)
+
+    async def handle_route(route: Route) -> None:
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if request.resource_type in blocked_types or any(
+            host == domain or host.endswith("." + domain) for domain in profile.blocked_domains
+        ):
+            stats["blocked"] += 1
+            await route.abort()
+        else:
+            stats["allowed"] += 1
+            await route.continue_()
+
+    await target.route("**/*", handle_route)
+    return stats
+
+
+async def measure_page_load(page: Page) -> dict[str, float]:
+    """
+    统计当前页面的加载耗时和传输字节数
+
+    返回:
+        dict: load_ms（页面加载耗时，毫秒）、transfer_bytes（传输字节数）、resources（资源请求数）
+    """
+    try:
+        return await page.evaluate(PAGE_METRICS_SCRIPT)
+    except Exception:
+        return {"load_ms": 0, "transfer_bytes": 0, "resources": 0}
+
+
 class LocalPlaywrightComputer(AsyncComputer):
     """使用本地Playwright浏览器实现的计算机接口，用于网络搜索"""
 
-    def __init__(self, start_url="https://www.bing.com"):
+    def __init__(self, start_url="https://www.bing.com", profile: LaunchProfile = INTERACTIVE_PROFILE):
         """
         初始化LocalPlaywrightComputer对象
         
         参数:
             start_url: 启动浏览器后访问的初始URL，默认为必应搜索引擎
+            profile: 浏览器启动配置，默认为有界面且不拦截请求
         """
         self._playwright: Union[Playwright, None] = None  # Playwright实例
         self._browser: Union[Browser, None] = None  # 浏览器实例
         self._page: Union[Page, None] = None  # 页面实例
         self._start_url = start_url  # 初始URL
+        self.profile = profile  # 浏览器启动配置
+        self.request_stats: dict[str, int] = {"blocked": 0, "allowed": 0}  # 请求拦截统计
 
     async def _get_browser_and_page(self) -> tuple[Browser, Page]:
         """
@@ -61,8 +162,9 @@ class LocalPlaywrightComputer(AsyncComputer):
         """
         width, height = self.dimensions  # 获取浏览器窗口尺寸
         launch_args = [f"--window-size={width},{height}"]  # 设置浏览器窗口尺寸的启动参数
-        browser = await self.playwright.chromium.launch(headless=False, args=launch_args)  # 启动有界面的Chrome浏览器
+        browser = await self.playwright.chromium.launch(headless=self.profile.headless, args=launch_args)  # 按启动配置启动Chrome浏览器
         page = await browser.new_page()  # 创建新页面
+        self.request_stats = await install_request_filter(page, self.profile)  # 按启动配置拦截无用的请求
         await page.set_viewport_size({"width": width, "height": height})  # 设置视口大小
         await page.goto(self._start_url)  # 导航到初始URL
         return browser, page  # 返回浏览器和页面实例
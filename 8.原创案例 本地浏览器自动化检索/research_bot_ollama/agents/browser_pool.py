@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Union
+
+# 导入Playwright异步API
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+from .browser_computer import SEARCH_PROFILE, LaunchProfile, LocalPlaywrightComputer, install_request_filter
+
+
+class PooledPageComputer(LocalPlaywrightComputer):
+    """
+    从浏览器池租用的页面
+
+    复用LocalPlaywrightComputer的点击、输入、滚动等操作方法，
+    但浏览器和页面由浏览器池管理，不会在使用结束时关闭浏览器。
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        context: BrowserContext,
+        page: Page,
+        profile: LaunchProfile,
+        request_stats: dict[str, int],
+    ):
+        """
+        初始化租用的页面
+
+        参数:
+            browser: 页面所属的浏览器实例
+            context: 页面所属的浏览器上下文
+            page: 页面实例
+            profile: 浏览器池使用的启动配置
+            request_stats: 该上下文的请求拦截统计
+        """
+        super().__init__(start_url=page.url, profile=profile)
+        self._browser = browser
+        self._page = page
+        self.context = context
+        self.request_stats = request_stats
+
+
+class _ContextSlot:
+    """浏览器池中的一个可复用浏览器上下文"""
+
+    def __init__(
+        self, browser_index: int, browser: Browser, context: BrowserContext, page: Page, request_stats: dict[str, int]
+    ):
+        self.browser_index = browser_index  # 所属浏览器在池中的序号
+        self.browser = browser  # 创建该上下文的浏览器实例，该序号的浏览器被重启后不再是池中的当前实例
+        self.context = context
+        self.page = page
+        self.request_stats = request_stats  # 请求拦截统计
+        self.uses = 0  # 已被租用的次数
+
+
+class BrowserPool:
+    """
+    进程级浏览器池
+
+    持有一个或几个长期运行的Chromium浏览器，对外租出轻量的BrowserContext/Page，
+    避免每次搜索都启动新的Playwright驱动和浏览器进程。
+    - 同时租出的页面数量受并发上限控制
+    - 每个上下文被使用一定次数后关闭并重新创建，避免状态和内存累积
+    - 租用前检查浏览器是否仍然连接，崩溃的浏览器会被重新启动
+    """
+
+    def __init__(
+        self,
+        num_browsers: int = 1,
+        max_leases: int = 5,
+        max_uses_per_context: int = 20,
+        dimensions: tuple[int, int] = (1024, 768),
+        profile: LaunchProfile = SEARCH_PROFILE,
+    ):
+        """
+        初始化浏览器池（浏览器在第一次租用时才启动）
+
+        参数:
+            num_browsers: 长期运行的浏览器数量
+            max_leases: 同时租出的页面数量上限
+            max_uses_per_context: 每个上下文最多被租用的次数，达到后重新创建
+            dimensions: 页面视口尺寸
+            profile: 浏览器启动配置，默认无头运行并拦截搜索用不到的资源
+        """
+        self.num_browsers = num_browsers
+        self.max_leases = max_leases
+        self.max_uses_per_context = max_uses_per_context
+        self.dimensions = dimensions
+        self.profile = profile
+        self._semaphore = asyncio.Semaphore(max_leases)
+        self._lock = asyncio.Lock()
+        self._playwright: Union[Playwright, None] = None
+        self._browsers: list[Union[Browser, None]] = [None] * num_browsers
+        self._active: list[int] = [0] * num_browsers  # 每个浏览器当前租出的上下文数量
+        self._idle: list[_ContextSlot] = []  # 空闲的可复用上下文
+        self.restarts = 0  # 浏览器重启次数
+
+    async def _launch_browser(self) -> Browser:
+        """启动一个浏览器实例"""
+        width, height = self.dimensions
+        launch_args = [f"--window-size={width},{height}"]  # 设置浏览器窗口尺寸的启动参数
+        return await self._playwright.chromium.launch(headless=self.profile.headless, args=launch_args)
+
+    async def _get_browser(self) -> tuple[int, Browser]:
+        """
+        选择当前负载最小的浏览器，必要时启动或重启浏览器
+
+        返回:
+            tuple: 浏览器在池中的序号和浏览器实例
+        """
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+            index = min(range(self.num_browsers), key=lambda i: self._active[i])
+            browser = self._browsers[index]
+            if browser is None or not browser.is_connected():
+                if browser is not None:
+                    # 浏览器已崩溃或断开：丢弃它的空闲上下文并重新启动
+                    print(f"浏览器 {index} 已断开，正在重启...")
+                    self._idle = [slot for slot in self._idle if slot.browser_index != index]
+                    self.restarts += 1
+                    with contextlib.suppress(Exception):
+                        await browser.close()
+                browser = await self._launch_browser()
+                self._browsers[index] = browser
+            return index, browser
+
+    async def _acquire_slot(self) -> _ContextSlot:
+        """取出一个健康的空闲上下文，没有可用的空闲上下文时新建一个"""
+        while self._idle:
+            slot = self._idle.pop()
+            if self._slot_healthy(slot) and not slot.page.is_closed():
+                self._active[slot.browser_index] += 1
+                return slot
+            with contextlib.suppress(Exception):
+                await slot.context.close()
+
+        index, browser = await self._get_browser()
+        width, height = self.dimensions
+        context = await browser.new_context(viewport={"width": width, "height": height})
+        request_stats = await install_request_filter(context, self.profile)  # 按启动配置拦截无用的请求
+        page = await context.new_page()
+        self._active[index] += 1
+        return _ContextSlot(index, browser, context, page, request_stats)
+
+    def _slot_healthy(self, slot: _ContextSlot) -> bool:
+        """上下文所属的浏览器仍是池中该序号的当前实例且仍然连接"""
+        return slot.browser is self._browsers[slot.browser_index] and slot.browser.is_connected()
+
+    async def _release_slot(self, slot: _ContextSlot, broken: bool) -> None:
+        """归还上下文：出错、达到使用次数上限或浏览器已断开时关闭它，否则放回空闲列表"""
+        self._active[slot.browser_index] -= 1
+        slot.uses += 1
+        if broken or slot.uses >= self.max_uses_per_context or not self._slot_healthy(slot):
+            with contextlib.suppress(Exception):
+                await slot.context.close()
+        else:
+            self._idle.append(slot)
+
+    @contextlib.asynccontextmanager
+    async def lease(self, start_url: Union[str, None] = None) -> AsyncIterator[PooledPageComputer]:
+        """
+        租用一个页面
+
+        参数:
+            start_url: 租用后导航到的初始URL，为None时不导航
+
+        返回:
+            PooledPageComputer: 可直接用于点击、输入等操作的页面
+        """
+        async with self._semaphore:
+            slot = await self._acquire_slot()
+            broken = False
+            # 每次租用重新计数，使拦截统计对应本次使用
+            slot.request_stats["blocked"] = slot.request_stats["allowed"] = 0
+            try:
+                if start_url:
+                    await slot.page.goto(start_url)
+                yield PooledPageComputer(slot.browser, slot.context, slot.page, self.profile, slot.request_stats)
+            except BaseException:
+                # 出错或被取消时页面状态不可信，关闭该上下文而不是复用
+                broken = True
+                raise
+            finally:
+                await self._release_slot(slot, broken)
+
+    async def close(self) -> None:
+        """关闭所有上下文和浏览器，并停止Playwright"""
+        async with self._lock:
+            for slot in self._idle:
+                with contextlib.suppress(Exception):
+                    await slot.context.close()
+            self._idle = []
+            for i, browser in enumerate(self._browsers):
+                if browser is not None:
+                    with contextlib.suppress(Exception):
+                        await browser.close()
+                self._browsers[i] = None
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+# 进程级共享的浏览器池
+_browser_pool: Union[BrowserPool, None] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取进程级共享的浏览器池，第一次调用时创建"""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+
+async def close_browser_pool() -> None:
+    """关闭进程级共享的浏览器池"""
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
@@ -1,10 +1,219 @@
 import asyncio
+import contextlib
+import contextvars
 import re
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, Union
+from urllib.parse import quote_plus
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
 
 from agents import function_tool
-from .browser_computer import LocalPlaywrightComputer
+from .browser_computer import LocalPlaywrightComputer, measure_page_load
+from .browser_pool import get_browser_pool
+from .cpu_pool import run_cpu_bound
+from .search_cache import caching_enabled, cache_key, normalize_query, replay_only, search_result_cache
+from .text_processing import format_snippet_summary, parse_search_html
+
+# 页面就绪等待的超时设置（毫秒），用就绪信号代替固定的sleep
+READINESS_TIMEOUTS = {
+    "search_box": 5000,     # 等待搜索框出现
+    "results": 10000,       # 等待搜索结果容器出现
+    "network_idle": 3000,   # 等待网络空闲的上限，超时后不再等待
+    "dom_stable": 3000,     # 等待DOM稳定的上限
+}
+
+# 搜索配置
+SEARCH_CONFIG = {
+    "engine": "bing",          # 使用的搜索引擎，见SEARCH_ENGINES
+    "navigation": "direct",    # "direct"：直接打开构造好的结果页URL，失败时退回输入；"interactive"：打开首页输入搜索词
+    "extraction": "in_page",   # "in_page"：在页面内按选择器提取片段，失败时退回HTML解析；"html"：下载完整HTML用BeautifulSoup解析
+}
+
+
+@dataclass(frozen=True)
+class SearchEngine:
+    """搜索引擎的页面信息和结果页URL构造方法"""
+
+    name: str
+    home_url: str                           # 首页，交互式输入时使用
+    search_box_selector: str                # 搜索框
+    results_selector: str                   # 搜索结果容器
+    build_url: Callable[[str], str]         # 根据查询词构造结果页URL
+    result_selectors: str                   # 搜索结果片段，页面内提取时使用
+
+
+def bing_search_url(query: str) -> str:
+    """构造Bing搜索结果页URL"""
+    return f"https://www.bing.com/search?q={quote_plus(query)}"
+
+
+def google_search_url(query: str) -> str:
+    """构造Google搜索结果页URL"""
+    return f"https://www.google.com/search?q={quote_plus(query)}"
+
+
+def duckduckgo_search_url(query: str) -> str:
+    """构造DuckDuckGo搜索结果页URL"""
+    return f"https://duckduckgo.com/?q={quote_plus(query)}"
+
+
+SEARCH_ENGINES: Dict[str, SearchEngine] = {}
+
+
+def register_search_engine(engine: SearchEngine) -> None:
+    """注册搜索引擎，之后可以通过SEARCH_CONFIG["engine"]选择它"""
+    SEARCH_ENGINES[engine.name] = engine
+
+
+register_search_engine(SearchEngine(
+    name="bing",
+    home_url="https://www.bing.com",
+    search_box_selector="#sb_form_q",
+    results_selector="#b_results",
+    build_url=bing_search_url,
+    result_selectors=".b_algo, .b_attribution",
+))
+register_search_engine(SearchEngine(
+    name="google",
+    home_url="https://www.google.com",
+    search_box_selector="textarea[name=q], input[name=q]",
+    results_selector="#search",
+    build_url=google_search_url,
+    result_selectors=".g .VwiC3b, .g .GI74Re",
+))
+register_search_engine(SearchEngine(
+    name="duckduckgo",
+    home_url="https://duckduckgo.com",
+    search_box_selector="input[name=q]",
+    results_selector="[data-testid=mainline], #links",
+    build_url=duckduckgo_search_url,
+    result_selectors="[data-testid=result-snippet], .result__snippet",
+))
+
+# 在页面内按选择器提取搜索结果片段，只把截断后的片段文本传回Python
+EXTRACT_SNIPPETS_SCRIPT = """([selectors, minLength, maxLength, limit]) => {
+    const snippets = [];
+    for (const element of document.querySelectorAll(selectors)) {
+        const text = (element.innerText || element.textContent || '').replace(/\\s+/g, ' ').trim();
+        if (text.length > minLength) {
+            snippets.push(text.length > maxLength ? text.slice(0, maxLength) + '...' : text);
+            if (snippets.length >= limit) break;
+        }
+    }
+    return snippets;
+}"""
+
+# 统计页面元素数量和文本长度，两次轮询结果相同视为DOM没有变化
+DOM_SIZE_SCRIPT = "() => [document.getElementsByTagName('*').length, document.body ? document.body.innerText.length : 0]"
+
+
+class PhaseTimer:
+    """记录搜索流程中每个阶段的耗时"""
+
+    def __init__(self):
+        self.timings: list[tuple[str, float]] = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """统计一个阶段的耗时（无论成功与否都会记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, (time.perf_counter() - start) * 1000))
+
+    def record(self, name: str, start: float) -> None:
+        """记录从start（time.perf_counter()的返回值）到现在的耗时"""
+        self.timings.append((name, (time.perf_counter() - start) * 1000))
+
+    def summary(self) -> str:
+        """生成各阶段耗时的摘要文本"""
+        total = sum(ms for _, ms in self.timings)
+        phases = "，".join(f"{name} {ms:.0f}ms" for name, ms in self.timings)
+        return f"{phases}（合计 {total:.0f}ms）"
+
+
+async def wait_for_dom_stable(page: Page, timeout_ms: int, interval_ms: int = 200, quiet_polls: int = 2) -> bool:
+    """
+    等待页面DOM稳定：连续若干次轮询元素数量和文本长度都没有变化
+
+    参数:
+        page: 页面实例
+        timeout_ms: 最长等待时间（毫秒）
+        interval_ms: 轮询间隔（毫秒）
+        quiet_polls: 需要连续保持不变的轮询次数
+
+    返回:
+        bool: 在超时前达到稳定返回True，否则返回False
+    """
+    deadline = time.perf_counter() + timeout_ms / 1000
+    last_size = None
+    unchanged = 0
+    while time.perf_counter() < deadline:
+        try:
+            size = await page.evaluate(DOM_SIZE_SCRIPT)
+        except Exception:
+            # 页面正在导航时执行上下文会被销毁，视为DOM仍在变化
+            size = None
+        if size is not None and size == last_size:
+            unchanged += 1
+            if unchanged >= quiet_polls:
+                return True
+        else:
+            unchanged = 0
+        last_size = size
+        await asyncio.sleep(interval_ms / 1000)
+    return False
+
+
+async def wait_for_results_ready(page: Page, engine: SearchEngine, timer: PhaseTimer) -> None:
+    """
+    等待搜索结果页就绪：结果容器出现、网络空闲（有上限）、DOM稳定
+
+    结果容器超时会抛出异常交给调用方处理；网络空闲和DOM稳定只是尽力等待，超时后继续提取。
+    """
+    with timer.phase("结果容器"):
+        await page.wait_for_selector(engine.results_selector, state="attached", timeout=READINESS_TIMEOUTS["results"])
+
+    with timer.phase("网络空闲"):
+        # 部分页面会持续发送请求，网络空闲只等待到上限
+        with contextlib.suppress(PlaywrightTimeoutError):
+            await page.wait_for_load_state("networkidle", timeout=READINESS_TIMEOUTS["network_idle"])
+
+    with timer.phase("DOM稳定"):
+        await wait_for_dom_stable(page, READINESS_TIMEOUTS["dom_stable"])
+
+async def navigate_direct(computer: LocalPlaywrightComputer, engine: SearchEngine, query: str, timer: PhaseTimer) -> None:
+    """直接打开构造好的搜索结果页URL，只需要一次页面加载"""
+    with timer.phase("打开结果页"):
+        await computer.page.goto(engine.build_url(query))
+    await wait_for_results_ready(computer.page, engine, timer)
+
+
+async def navigate_interactive(computer: LocalPlaywrightComputer, engine: SearchEngine, query: str, timer: PhaseTimer) -> None:
+    """打开搜索引擎首页，在搜索框中输入搜索词并按回车"""
+    with timer.phase("打开首页"):
+        await computer.page.goto(engine.home_url)
+
+    # 等待搜索框出现并点击，找不到时点击页面中央位置
+    with timer.phase("搜索框就绪"):
+        try:
+            search_box = await computer.page.wait_for_selector(
+                engine.search_box_selector, state="visible", timeout=READINESS_TIMEOUTS["search_box"]
+            )
+            await search_box.click()
+        except Exception:
+            width, height = computer.dimensions
+            await computer.click(width // 2, height // 3)
+
+    with timer.phase("输入搜索词"):
+        await computer.type(query)
+        # 按回车键搜索
+        await computer.keypress(["enter"])
+
+    await wait_for_results_ready(computer.page, engine, timer)
+
 
 class BrowserSearchResult:
     """浏览器搜索结果类，用于存储和处理搜索结果"""
@@ -23,66 +232,184 @@ class BrowserSearchResult:
         else:
             return "未找到相关内容"
 
+def build_summary(result: BrowserSearchResult) -> None:
+    """根据片段生成摘要，总量控制更严格"""
+    result.summary = format_snippet_summary(result.snippets)
+
+
+async def extract_search_results_in_page(page: Page, engine: SearchEngine) -> BrowserSearchResult:
+    """
+    在页面内按搜索引擎的选择器提取搜索结果片段，不下载完整HTML
+
+    先使用搜索引擎的结果选择器，没有结果时退回到页面中的段落。
+    """
+    result = BrowserSearchResult()
+    for selectors, min_length in ((engine.result_selectors, 20), ("p", 30)):
+        result.snippets = await page.evaluate(EXTRACT_SNIPPETS_SCRIPT, [selectors, min_length, 200, 3])
+        if result.snippets:
+            break
+    build_summary(result)
+    return result
+
+
+async def extract_results(computer: LocalPlaywrightComputer, engine: SearchEngine) -> BrowserSearchResult:
+    """按SEARCH_CONFIG["extraction"]提取搜索结果，页面内提取失败或没有结果时退回HTML解析"""
+    if SEARCH_CONFIG["extraction"] == "in_page":
+        try:
+            result = await extract_search_results_in_page(computer.page, engine)
+            if result.snippets:
+                return result
+        except Exception as e:
+            print(f"页面内提取失败: {str(e)}，改为解析HTML")
+    return await extract_search_results(computer)
+
+
 async def extract_search_results(computer: LocalPlaywrightComputer) -> BrowserSearchResult:
-    """从搜索结果页面提取信息"""
+    """从搜索结果页面提取信息（下载完整HTML并用BeautifulSoup解析）"""
     result = BrowserSearchResult()
     
     try:
         # 获取页面内容
         html_content = await computer.page.content()
-        # 不再存储完整内容，减少内存占用
-        # result.full_content = html_content
-        
-        # 使用BeautifulSoup解析HTML
-        soup = BeautifulSoup(html_content, 'html.parser')
         
-        # 尝试提取搜索结果（适用于多种搜索引擎）
-        # Bing搜索结果
-        search_results = soup.select('.b_algo, .b_attribution')
-        if search_results:
-            snippets = []
-            for item in search_results:
-                text = item.get_text(strip=True)
-                if text and len(text) > 20:  # 忽略太短的内容
-                    # 限制每个片段的长度
-                    snippets.append(text[:200] + "..." if len(text) > 200 else text)
-            result.snippets = snippets[:3]  # 减少为前3个结果
+        # 在执行池中解析HTML，避免大页面阻塞事件循环上的其他搜索，只传回截断后的片段
+        result.snippets = await run_cpu_bound(parse_search_html, html_content)
         
-        # Google搜索结果
-        if not result.snippets:
-            search_results = soup.select('.g .VwiC3b, .g .GI74Re')
-            if search_results:
-                snippets = []
-                for item in search_results:
-                    text = item.get_text(strip=True)
-                    if text and len(text) > 20:
-                        # 限制每个片段的长度
-                        snippets.append(text[:200] + "..." if len(text) > 200 else text)
-                result.snippets = snippets[:3]
-        
-        # 通用提取方法（如果以上方法失败）
-        if not result.snippets:
-            # 查找所有段落并提取文本
-            paragraphs = soup.find_all('p')
-            snippets = []
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                if text and len(text) > 30:  # 忽略太短的段落
-                    # 限制每个片段的长度
-                    snippets.append(text[:200] + "..." if len(text) > 200 else text)
-            result.snippets = snippets[:3]
-        
-        # 生成摘要，总量控制更严格
-        if result.snippets:
-            result.summary = "搜索结果摘要:\n" + "\n".join([f"- {s[:100]}..." if len(s) > 100 else f"- {s}" for s in result.snippets])
-        else:
-            result.summary = "未能提取到有效的搜索结果。"
+        # 生成摘要
+        build_summary(result)
         
     except Exception as e:
         result.summary = f"提取搜索结果时出错: {str(e)}"
     
     return result
 
+def search_result_key(search_query: str, engine_name: Union[str, None] = None) -> str:
+    """搜索结果缓存的键：规范化的查询词加搜索引擎名称"""
+    return cache_key(engine_name or SEARCH_CONFIG["engine"], normalize_query(search_query))
+
+
+def get_cached_search_result(search_query: str) -> Union[BrowserSearchResult, None]:
+    """读取缓存的搜索结果，未启用缓存或未命中时返回None"""
+    if not caching_enabled():
+        return None
+    cached = search_result_cache.get(search_result_key(search_query))
+    if cached is None:
+        return None
+    result = BrowserSearchResult()
+    result.snippets = cached["snippets"]
+    result.summary = cached["summary"]
+    return result
+
+
+# 当前任务中浏览器搜索工具实际返回的结果，每次调用追加一条 (查询词, 片段)，失败时片段为None；
+# 调用方用record_tool_searches()开启记录，未开启时不记录
+_tool_searches: contextvars.ContextVar[Union[List[tuple[str, Union[List[str], None]]], None]] = contextvars.ContextVar(
+    "tool_searches", default=None
+)
+
+
+def record_tool_searches() -> List[tuple[str, Union[List[str], None]]]:
+    """
+    开始记录当前任务（及其创建的子任务）中浏览器搜索工具返回的结果
+
+    返回:
+        list: 记录列表，工具每次返回后追加一条 (查询词, 片段)，搜索失败时片段为None
+    """
+    searches: List[tuple[str, Union[List[str], None]]] = []
+    _tool_searches.set(searches)
+    return searches
+
+
+def _record_tool_search(search_query: str, snippets: Union[List[str], None]) -> None:
+    searches = _tool_searches.get()
+    if searches is not None:
+        searches.append((search_query, None if snippets is None else list(snippets)))
+
+
+async def run_browser_search(search_query: str) -> str:
+    """
+    使用本地浏览器执行网络搜索并返回结果摘要，优先使用磁盘缓存中的结果
+
+    参数:
+        search_query: 要搜索的查询词
+
+    返回:
+        str: 搜索结果的摘要文本
+    """
+    cached = get_cached_search_result(search_query)
+    if cached is not None:
+        print(f"搜索缓存命中: {search_query}")
+        _record_tool_search(search_query, cached.snippets)
+        return str(cached)
+    if replay_only():
+        _record_tool_search(search_query, None)
+        return f"缓存中没有该查询的搜索结果（仅缓存模式）: {search_query}"
+
+    engine = SEARCH_ENGINES[SEARCH_CONFIG["engine"]]
+    # 最多尝试3次
+    max_attempts = 3
+    for attempt in range(max_attempts):
+        timer = PhaseTimer()
+        leased = False
+        try:
+            # 从共享浏览器池租用页面，使用上下文管理器确保页面被归还；
+            # 出错时异常先离开上下文管理器，页面池关闭出错的上下文并释放名额，再在外面等待重试
+            lease_start = time.perf_counter()
+            async with get_browser_pool().lease() as computer:
+                leased = True
+                timer.record("租用页面", lease_start)
+                if SEARCH_CONFIG["navigation"] == "direct":
+                    try:
+                        await navigate_direct(computer, engine, search_query, timer)
+                    except Exception as e:
+                        # 结果页URL打不开或结构不符时，退回到交互式输入
+                        print(f"直接打开结果页失败: {str(e)}，改为在搜索框中输入")
+                        await navigate_interactive(computer, engine, search_query, timer)
+                else:
+                    await navigate_interactive(computer, engine, search_query, timer)
+
+                # 记录页面加载耗时、传输字节数和被拦截的请求数
+                metrics = await measure_page_load(computer.page)
+                print(
+                    f"搜索页面加载 {metrics['load_ms']:.0f}ms，传输 {metrics['transfer_bytes'] / 1024:.1f}KB，"
+                    f"拦截请求 {computer.request_stats['blocked']} 个"
+                )
+
+                # 提取搜索结果
+                with timer.phase("提取结果"):
+                    search_result = await extract_results(computer, engine)
+
+                # 滚动页面以加载更多内容，等待DOM稳定后再次提取
+                with timer.phase("滚动后稳定"):
+                    await computer.scroll(0, 0, 0, 300)
+                    await wait_for_dom_stable(computer.page, READINESS_TIMEOUTS["dom_stable"])
+
+                # 再次提取结果（可能会有更多内容）
+                with timer.phase("再次提取"):
+                    updated_result = await extract_results(computer, engine)
+                if len(updated_result.snippets) > len(search_result.snippets):
+                    search_result = updated_result
+
+            print(f"搜索阶段耗时: {timer.summary()}")
+            break
+
+        except Exception as e:
+            if attempt == max_attempts - 1:  # 最后一次尝试
+                _record_tool_search(search_query, None)
+                return f"{'浏览器搜索过程中' if leased else '浏览器初始化'}出错: {str(e)}"
+            print(f"{'搜索' if leased else '浏览器初始化'}尝试 {attempt+1} 失败: {str(e)}（{timer.summary()}），正在重试...")
+            await asyncio.sleep(2)  # 页面已归还，稍等一下再重试
+
+    # 搜索已经成功，写缓存放在重试循环之外，写入失败不会被当作搜索失败而重新搜索；只缓存提取到片段的结果
+    if caching_enabled() and search_result.snippets:
+        search_result_cache.set(
+            search_result_key(search_query, engine.name),
+            {"snippets": search_result.snippets, "summary": search_result.summary},
+        )
+    _record_tool_search(search_query, search_result.snippets)
+    return str(search_result)
+
+
 @function_tool
 async def browser_search(search_query: str) -> str:
     """
@@ -94,66 +421,4 @@ async def browser_search(search_query: str) -> str:
     Returns:
         搜索结果的摘要文本。
     """
-    # 最多尝试3次
-    max_attempts = 3
-    for attempt in range(max_attempts):
-        try:
-            # 使用上下文管理器确保资源正确释放
-            async with LocalPlaywrightComputer(start_url="https://www.bing.com") as computer:
-                try:
-                    # 等待搜索框加载
-                    await asyncio.sleep(2)
-                    
-                    # 查找并点击搜索框
-                    # 尝试多种可能的选择器，兼容不同搜索引擎
-                    try:
-                        # Bing搜索框
-                        search_box = await computer.page.query_selector('#sb_form_q')
-                        if search_box:
-                            await search_box.click()
-                        else:
-                            # 尝试直接点击页面中央位置
-                            width, height = computer.dimensions
-                            await computer.click(width // 2, height // 3)
-                    except Exception:
-                        # 如果无法找到特定元素，尝试点击页面中央
-                        width, height = computer.dimensions
-                        await computer.click(width // 2, height // 3)
-                    
-                    # 输入搜索词 - 限制长度
-                    limited_query = search_query[:50] if len(search_query) > 50 else search_query
-                    await computer.type(limited_query)
-                    await asyncio.sleep(1)
-                    
-                    # 按回车键搜索
-                    await computer.keypress(["enter"])
-                    
-                    # 等待搜索结果加载
-                    await asyncio.sleep(5)
-                    
-                    # 提取搜索结果
-                    search_result = await extract_search_results(computer)
-                    
-                    # 滚动页面以加载更多内容
-                    await computer.scroll(0, 0, 0, 300)
-                    await asyncio.sleep(2)
-                    
-                    # 再次提取结果（可能会有更多内容）
-                    updated_result = await extract_search_results(computer)
-                    if len(updated_result.snippets) > len(search_result.snippets):
-                        search_result = updated_result
-                    
-                    return str(search_result)
-                    
-                except Exception as e:
-                    if attempt == max_attempts - 1:  # 最后一次尝试
-                        return f"浏览器搜索过程中出错: {str(e)}"
-                    else:
-                        print(f"搜索尝试 {attempt+1} 失败: {str(e)}，正在重试...")
-                        await asyncio.sleep(2)  # 稍等一下再重试
-        except Exception as e:
-            if attempt == max_attempts - 1:  # 最后一次尝试
-                return f"浏览器初始化出错: {str(e)}"
-            else:
-                print(f"浏览器初始化尝试 {attempt+1} 失败: {str(e)}，正在重试...")
-                await asyncio.sleep(2)  # 稍等一下再重试 
\ No newline at end of file
+    return await run_browser_search(search_query)
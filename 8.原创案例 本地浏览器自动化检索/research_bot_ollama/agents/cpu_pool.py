@@ -0,0 +1,116 @@
+import asyncio
+import concurrent.futures
+import statistics
+import time
+from typing import Any, Callable, Union
+
+# CPU密集型任务执行池配置
+CPU_POOL_CONFIG = {
+    "kind": "process",   # "process"：进程池，HTML解析不受GIL限制；"thread"：线程池；"inline"：直接在事件循环中执行
+    "max_workers": 2,    # 工作进程/线程数量上限
+}
+
+_executor: Union[concurrent.futures.Executor, None] = None
+
+
+def get_cpu_executor() -> Union[concurrent.futures.Executor, None]:
+    """获取CPU密集型任务的执行池，第一次调用时创建；inline模式返回None"""
+    global _executor
+    if CPU_POOL_CONFIG["kind"] == "inline":
+        return None
+    if _executor is None:
+        if CPU_POOL_CONFIG["kind"] == "process":
+            _executor = concurrent.futures.ProcessPoolExecutor(max_workers=CPU_POOL_CONFIG["max_workers"])
+        else:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=CPU_POOL_CONFIG["max_workers"], thread_name_prefix="cpu-pool"
+            )
+    return _executor
+
+
+def shutdown_cpu_executor() -> None:
+    """关闭执行池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    在执行池中运行CPU密集型函数，避免阻塞事件循环
+
+    进程池模式下func必须是模块级函数，参数和返回值必须可以序列化。
+
+    参数:
+        func: 要执行的函数
+        *args: 函数参数
+
+    返回:
+        函数的返回值
+    """
+    executor = get_cpu_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟监视器
+
+    定期休眠一小段时间，实际唤醒时间比预期晚多少就是事件循环被阻塞的时间。
+    """
+
+    def __init__(self, interval: float = 0.05):
+        """
+        参数:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self.lags_ms: list[float] = []
+        self._task: Union[asyncio.Task, None] = None
+        self._sleep_start = 0.0
+
+    async def _sample(self) -> None:
+        while True:
+            self._sleep_start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append(max(0.0, (time.perf_counter() - self._sleep_start - self.interval) * 1000))
+
+    def start(self) -> None:
+        """开始采样"""
+        self.lags_ms = []
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> None:
+        """停止采样"""
+        if self._task is not None:
+            # 停止时正在进行的采样也计入，否则最后一段阻塞会被漏掉
+            lag = (time.perf_counter() - self._sleep_start - self.interval) * 1000
+            if lag > 0:
+                self.lags_ms.append(lag)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self) -> "EventLoopLagMonitor":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
+
+    def summary(self) -> str:
+        """生成延迟统计摘要"""
+        if not self.lags_ms:
+            return "事件循环延迟: 无采样"
+        ordered = sorted(self.lags_ms)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f"事件循环延迟: 平均 {statistics.mean(ordered):.1f}ms，p95 {p95:.1f}ms，"
+            f"最大 {ordered[-1]:.1f}ms（{len(ordered)} 次采样）"
+        )
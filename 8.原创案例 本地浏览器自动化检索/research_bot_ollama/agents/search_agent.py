@@ -2,6 +2,7 @@ from openai import AsyncOpenAI
 from agents import Agent, ModelSettings, OpenAIChatCompletionsModel
 
 from .browser_search import browser_search
+from .search_cache import cache_key, normalize_query
 
 # 定义要使用的Ollama模型名称
 MODEL_NAME = "qwq:latest" 
@@ -33,3 +34,25 @@ search_agent = Agent(
     ),
     model_settings=ModelSettings(temperature=0.3),
 )
+
+
+def search_summary_key(search_query: str, tool_searches: list[tuple[str, list[str]]]) -> str:
+    """
+    搜索摘要缓存的键：搜索代理的指令、规范化的搜索词，以及搜索工具实际搜索的查询词和返回的片段
+
+    参数:
+        search_query: 交给搜索代理的搜索词
+        tool_searches: 搜索代理调用浏览器搜索工具时实际搜索的 (查询词, 片段) 列表
+
+    返回:
+        str: 缓存键
+    """
+    parts = [INSTRUCTIONS, normalize_query(search_query)]
+    for query, snippets in tool_searches:
+        parts += [normalize_query(query), str(len(snippets)), *snippets]
+    return cache_key(*parts)
+
+
+def tool_queries_key(search_query: str) -> str:
+    """搜索代理为某个搜索词实际调用搜索工具时使用的查询词列表的缓存键"""
+    return cache_key("tool_queries", INSTRUCTIONS, normalize_query(search_query))
@@ -0,0 +1,146 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Union
+
+# 搜索缓存配置
+CACHE_CONFIG = {
+    # "read_write"：正常读写缓存；"replay"：只读缓存，未命中时不打开浏览器；"off"：不使用缓存
+    "mode": "read_write",
+    "directory": Path(__file__).parent.parent / "search_cache",  # 缓存目录
+    "ttl_seconds": 24 * 3600,             # 缓存有效期（秒）
+    "max_bytes": 20 * 1024 * 1024,        # 每一层缓存占用的最大磁盘空间，超出后淘汰最久未使用的条目
+}
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询词：统一全角/半角字符、转为小写、合并空白"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def cache_key(*parts: str) -> str:
+    """由若干字符串生成缓存键"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    磁盘缓存：每个条目保存为一个JSON文件
+
+    - 条目超过有效期后视为未命中并删除，格式不对的条目也视为未命中
+    - 总大小超过上限时按最近使用时间（文件修改时间）淘汰最旧的条目
+    - 缓存只用于加速，写入失败时只打印警告，不影响调用方
+    """
+
+    def __init__(self, name: str, directory: Path, ttl_seconds: float, max_bytes: int):
+        """
+        初始化磁盘缓存
+
+        参数:
+            name: 缓存名称，同时作为缓存目录下的子目录名
+            directory: 缓存根目录
+            ttl_seconds: 条目有效期（秒）
+            max_bytes: 占用磁盘空间的上限（字节）
+        """
+        self.name = name
+        self.directory = Path(directory) / name
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Union[Any, None]:
+        """读取缓存条目，不存在或已过期时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        try:
+            expired = time.time() - entry["stored_at"] > self.ttl_seconds
+            value = entry["value"]
+        except (KeyError, TypeError):
+            expired = True  # 格式不对的条目（例如被其他程序写坏）按过期处理
+        if expired:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # 更新修改时间，作为最近使用时间供淘汰时参考
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存条目，写入后按需淘汰旧条目；写入失败时打印警告并放弃本次写入"""
+        tmp_path = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再替换，避免并发读取到写了一半的文件；
+            # 每次写入使用唯一的临时文件名，同一个键的并发写入互不干扰
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.directory, prefix=f"{key}.", suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
+                json.dump({"stored_at": time.time(), "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+            self._evict()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"{self.name}缓存写入失败: {str(e)}")
+        finally:
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+
+    def _evict(self) -> None:
+        """总大小超过上限时删除最久未使用的条目"""
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> str:
+        """返回命中统计"""
+        return f"{self.name}缓存 命中 {self.hits} 次，未命中 {self.misses} 次"
+
+
+def caching_enabled() -> bool:
+    """是否读写缓存"""
+    return CACHE_CONFIG["mode"] != "off"
+
+
+def replay_only() -> bool:
+    """是否只读缓存（未命中时不执行真实搜索）"""
+    return CACHE_CONFIG["mode"] == "replay"
+
+
+# 第一层：浏览器搜索结果，键为规范化的查询词和搜索引擎
+search_result_cache = DiskCache("results", CACHE_CONFIG["directory"], CACHE_CONFIG["ttl_seconds"], CACHE_CONFIG["max_bytes"])
+
+# 第二层：搜索代理生成的摘要，键为搜索结果片段和搜索代理的指令
+summary_cache = DiskCache("summaries", CACHE_CONFIG["directory"], CACHE_CONFIG["ttl_seconds"], CACHE_CONFIG["max_bytes"])
@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+
+from .planner_agent import WebSearchItem
+from .search_cache import normalize_query
+
+# 搜索计划去重和排序配置
+RANKING_CONFIG = {
+    "shingle_size": 2,            # 字符片段长度，按字符切分对中文和英文都适用
+    "duplicate_threshold": 0.6,   # 两条查询的片段Jaccard相似度达到该值视为近似重复
+    "relevance_weight": 0.7,      # MMR中与原始问题相关性的权重，其余权重用于惩罚与已选查询的相似度
+}
+
+
+@dataclass
+class RankedSearches:
+    """搜索计划去重和排序的结果"""
+
+    selected: list[WebSearchItem]
+    """按优先级排列、将要执行的搜索"""
+
+    duplicates: list[WebSearchItem] = field(default_factory=list)
+    """被合并掉的近似重复搜索"""
+
+    dropped: list[WebSearchItem] = field(default_factory=list)
+    """超出搜索数量上限、不再执行的搜索"""
+
+
+def shingles(text: str, size: int) -> set[str]:
+    """把规范化后的文本（去掉空白）切成长度为size的字符片段"""
+    text = normalize_query(text).replace(" ", "")
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    """两个片段集合的Jaccard相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def rank_searches(query: str, items: list[WebSearchItem], budget: int) -> RankedSearches:
+    """
+    对规划代理给出的搜索去重并按优先级排序
+
+    1. 按规划顺序把近似重复的查询聚成一组，每组只保留最先出现的一条
+    2. 用MMR（最大边际相关性）排序：每次选出与原始问题最相关、同时与已选查询最不相似的一条
+    3. 按排序结果保留前budget条
+
+    参数:
+        query: 用户的原始研究问题
+        items: 规划代理给出的搜索项
+        budget: 最多执行的搜索数量
+
+    返回:
+        RankedSearches: 将要执行的搜索，以及被去重和被舍弃的搜索
+    """
+    size = RANKING_CONFIG["shingle_size"]
+    weight = RANKING_CONFIG["relevance_weight"]
+
+    # 按规划顺序聚类，每组的代表是最先出现的一条
+    representatives: list[tuple[WebSearchItem, set[str]]] = []
+    duplicates = []
+    for item in items:
+        item_shingles = shingles(item.query, size)
+        if any(jaccard(item_shingles, rep_shingles) >= RANKING_CONFIG["duplicate_threshold"]
+               for _, rep_shingles in representatives):
+            duplicates.append(item)
+        else:
+            representatives.append((item, item_shingles))
+
+    # 相关性：查询覆盖了原始问题中多少字符片段
+    query_shingles = shingles(query, size)
+    relevance = [
+        len(rep_shingles & query_shingles) / len(query_shingles) if query_shingles else 0.0
+        for _, rep_shingles in representatives
+    ]
+
+    # MMR排序，分数相同时保持规划顺序
+    remaining = list(range(len(representatives)))
+    order: list[int] = []
+    while remaining:
+        def mmr(i: int) -> float:
+            redundancy = max((jaccard(representatives[i][1], representatives[j][1]) for j in order), default=0.0)
+            return weight * relevance[i] - (1 - weight) * redundancy
+
+        best = max(remaining, key=lambda i: (mmr(i), -i))
+        order.append(best)
+        remaining.remove(best)
+
+    ranked = [representatives[i][0] for i in order]
+    return RankedSearches(selected=ranked[:budget], duplicates=duplicates, dropped=ranked[budget:])
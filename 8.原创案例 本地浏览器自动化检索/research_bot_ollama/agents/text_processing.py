@@ -0,0 +1,60 @@
+"""
+搜索结果的HTML解析和文本处理
+
+这里的函数都是纯CPU计算，不依赖事件循环和浏览器，可以放到进程池或线程池中执行（见cpu_pool.py），
+参数和返回值都是可序列化的简单类型，返回的只是截断后的片段。
+"""
+
+from bs4 import BeautifulSoup
+
+
+def truncate_text(text: str, max_length: int) -> str:
+    """截断过长的文本并加上省略号"""
+    return text[:max_length] + "..." if len(text) > max_length else text
+
+
+def collect_snippets(elements, min_length: int, max_length: int = 200, limit: int = 3) -> list[str]:
+    """提取元素文本，忽略太短的内容，并限制每个片段的长度和片段数量"""
+    snippets = []
+    for element in elements:
+        text = element.get_text(strip=True)
+        if text and len(text) > min_length:
+            snippets.append(truncate_text(text, max_length))
+            if len(snippets) >= limit:
+                break
+    return snippets
+
+
+def parse_search_html(html_content: str) -> list[str]:
+    """
+    用BeautifulSoup解析搜索结果页HTML，提取前3个搜索结果片段
+
+    依次尝试Bing、Google的搜索结果选择器，都没有结果时提取页面中的段落。
+
+    参数:
+        html_content: 搜索结果页的完整HTML
+
+    返回:
+        list[str]: 截断后的片段
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Bing搜索结果
+    snippets = collect_snippets(soup.select('.b_algo, .b_attribution'), min_length=20)
+
+    # Google搜索结果
+    if not snippets:
+        snippets = collect_snippets(soup.select('.g .VwiC3b, .g .GI74Re'), min_length=20)
+
+    # 通用提取方法（如果以上方法失败）
+    if not snippets:
+        snippets = collect_snippets(soup.find_all('p'), min_length=30)
+
+    return snippets
+
+
+def format_snippet_summary(snippets: list[str]) -> str:
+    """根据片段生成摘要，总量控制更严格"""
+    if not snippets:
+        return "未能提取到有效的搜索结果。"
+    return "搜索结果摘要:\n" + "\n".join(f"- {truncate_text(s, 100)}" for s in snippets)
@@ -0,0 +1,186 @@
+"""
+研究机器人搜索阶段的基准测试工具
+
+用法示例:
+    python -m examples.research_bot_ollama.benchmark filter
+    python -m examples.research_bot_ollama.benchmark filter --queries "大语言模型" "量子计算"
+    python -m examples.research_bot_ollama.benchmark extraction --repeat 20
+    python -m examples.research_bot_ollama.benchmark loop-lag --searches 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import statistics
+import time
+
+from .agents.browser_computer import SEARCH_PROFILE, LaunchProfile, measure_page_load
+from .agents.browser_pool import BrowserPool
+from .agents.cpu_pool import CPU_POOL_CONFIG, EventLoopLagMonitor, run_cpu_bound, shutdown_cpu_executor
+from .agents.browser_search import (
+    SEARCH_ENGINES,
+    bing_search_url,
+    extract_search_results,
+    extract_search_results_in_page,
+)
+from .agents.text_processing import parse_search_html
+
+DEFAULT_QUERIES = ["大语言模型 最新进展", "量子计算 应用", "电动汽车 电池技术", "Python asyncio 教程", "气候变化 影响"]
+
+
+async def measure_searches(profile: LaunchProfile, queries: list[str]) -> list[dict[str, float]]:
+    """
+    使用给定的启动配置依次打开每个查询的搜索结果页，统计页面加载耗时、传输字节数和被拦截的请求数
+
+    参数:
+        profile: 浏览器启动配置
+        queries: 搜索查询列表
+
+    返回:
+        list: 每个查询的统计数据
+    """
+    pool = BrowserPool(profile=profile)
+    measurements = []
+    try:
+        for query in queries:
+            url = bing_search_url(query)
+            async with pool.lease() as computer:
+                await computer.page.goto(url, wait_until="load")
+                metrics = await measure_page_load(computer.page)
+                metrics["blocked"] = computer.request_stats["blocked"]
+                measurements.append(metrics)
+    finally:
+        await pool.close()
+    return measurements
+
+
+async def benchmark_request_filter(queries: list[str]) -> None:
+    """对比开启和关闭请求拦截时搜索结果页的加载耗时和传输字节数"""
+    profiles = {
+        "拦截开启": SEARCH_PROFILE,
+        "拦截关闭": dataclasses.replace(SEARCH_PROFILE, blocked_resource_types=(), blocked_domains=()),
+    }
+    for label, profile in profiles.items():
+        measurements = await measure_searches(profile, queries)
+        load_ms = [m["load_ms"] for m in measurements]
+        transfer_kb = [m["transfer_bytes"] / 1024 for m in measurements]
+        print(
+            f"{label}: 平均加载 {statistics.mean(load_ms):.0f}ms（最慢 {max(load_ms):.0f}ms），"
+            f"平均传输 {statistics.mean(transfer_kb):.1f}KB，"
+            f"平均拦截请求 {statistics.mean(m['blocked'] for m in measurements):.1f} 个"
+        )
+
+
+async def benchmark_extraction(queries: list[str], repeat: int) -> None:
+    """
+    对比两种搜索结果提取方式每次提取传回Python的字节数、Python进程CPU时间和耗时
+
+    - html：page.content()下载完整HTML，再用BeautifulSoup解析
+    - in_page：在页面内按选择器提取，只传回片段文本（选择器匹配的CPU开销在浏览器进程中）
+
+    测量期间HTML解析改为直接在当前进程中执行，使process_time包含解析开销，而不是算在进程池的子进程上。
+    """
+    engine = SEARCH_ENGINES["bing"]
+    stats = {"html": {"bytes": [], "cpu_ms": [], "wall_ms": []}, "in_page": {"bytes": [], "cpu_ms": [], "wall_ms": []}}
+    pool = BrowserPool()
+    previous_kind = CPU_POOL_CONFIG["kind"]
+    CPU_POOL_CONFIG["kind"] = "inline"
+    try:
+        for query in queries:
+            async with pool.lease() as computer:
+                await computer.page.goto(engine.build_url(query), wait_until="load")
+                for _ in range(repeat):
+                    cpu_start, wall_start = time.process_time(), time.perf_counter()
+                    await extract_search_results(computer)
+                    stats["html"]["cpu_ms"].append((time.process_time() - cpu_start) * 1000)
+                    stats["html"]["wall_ms"].append((time.perf_counter() - wall_start) * 1000)
+                    # 在计时之外再取一次HTML，统计extract_search_results传回的字节数
+                    html = await computer.page.content()
+                    stats["html"]["bytes"].append(len(html.encode("utf-8")))
+
+                    cpu_start, wall_start = time.process_time(), time.perf_counter()
+                    result = await extract_search_results_in_page(computer.page, engine)
+                    stats["in_page"]["cpu_ms"].append((time.process_time() - cpu_start) * 1000)
+                    stats["in_page"]["wall_ms"].append((time.perf_counter() - wall_start) * 1000)
+                    stats["in_page"]["bytes"].append(len(json.dumps(result.snippets, ensure_ascii=False).encode("utf-8")))
+    finally:
+        CPU_POOL_CONFIG["kind"] = previous_kind
+        await pool.close()
+
+    for method, values in stats.items():
+        print(
+            f"{method}: 每次提取传回 {statistics.mean(values['bytes']) / 1024:.1f}KB，"
+            f"Python CPU时间 {statistics.mean(values['cpu_ms']):.2f}ms，"
+            f"耗时 {statistics.mean(values['wall_ms']):.2f}ms"
+        )
+
+
+def build_synthetic_serp(num_results: int) -> str:
+    """生成一个包含大量搜索结果的Bing风格结果页HTML，用于离线测量解析开销"""
+    items = "".join(
+        f'<li class="b_algo"><h2><a href="https://example.com/{i}">第{i}条结果</a></h2>'
+        f'<div class="b_caption"><p>{"这是一段用于测量解析开销的搜索结果摘要文本。" * 8}</p></div></li>'
+        for i in range(num_results)
+    )
+    return f'<html><body><ol id="b_results">{items}</ol></body></html>'
+
+
+async def benchmark_loop_lag(num_searches: int, num_results: int) -> None:
+    """
+    在多个并发搜索同时解析大结果页时，测量不同执行方式下的事件循环延迟
+
+    每个模拟搜索先等待一段模拟的页面加载时间，再解析同一个大结果页；
+    inline模式直接在事件循环中解析（原有方式），thread/process模式交给执行池。
+    """
+    html = build_synthetic_serp(num_results)
+    print(f"模拟结果页大小 {len(html.encode('utf-8')) / 1024:.0f}KB，并发搜索 {num_searches} 个")
+
+    for kind in ("inline", "thread", "process"):
+        CPU_POOL_CONFIG["kind"] = kind
+        shutdown_cpu_executor()
+        # 预热执行池，避免把进程启动时间算进延迟
+        await run_cpu_bound(parse_search_html, "<p></p>")
+
+        async def simulated_search(i: int) -> list[str]:
+            await asyncio.sleep(0.05 * i)
+            return await run_cpu_bound(parse_search_html, html)
+
+        start = time.perf_counter()
+        async with EventLoopLagMonitor(interval=0.01) as monitor:
+            await asyncio.gather(*(simulated_search(i) for i in range(num_searches)))
+        print(f"{kind}: 总耗时 {(time.perf_counter() - start) * 1000:.0f}ms，{monitor.summary()}")
+    shutdown_cpu_executor()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="研究机器人搜索阶段的基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    filter_parser = subparsers.add_parser("filter", help="对比开启和关闭请求拦截时的页面加载耗时和带宽")
+    filter_parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES, help="搜索查询列表")
+
+    extraction_parser = subparsers.add_parser("extraction", help="对比HTML解析和页面内提取的传输字节数和CPU时间")
+    extraction_parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES, help="搜索查询列表")
+    extraction_parser.add_argument("--repeat", type=int, default=10, help="每个搜索结果页重复提取的次数")
+
+    lag_parser = subparsers.add_parser("loop-lag", help="测量并发搜索解析HTML时的事件循环延迟")
+    lag_parser.add_argument("--searches", type=int, default=5, help="并发搜索数量")
+    lag_parser.add_argument("--results", type=int, default=2000, help="模拟结果页中的搜索结果数量")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.command == "filter":
+        asyncio.run(benchmark_request_filter(args.queries))
+    elif args.command == "extraction":
+        asyncio.run(benchmark_extraction(args.queries, args.repeat))
+    elif args.command == "loop-lag":
+        asyncio.run(benchmark_loop_lag(args.searches, args.results))
+
+
+if __name__ == "__main__":
+    main()
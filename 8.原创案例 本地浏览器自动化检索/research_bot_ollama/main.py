@@ -1,9 +1,11 @@
+import argparse
 import asyncio
 import os
 from openai import AsyncOpenAI
 from agents import set_default_openai_client
 
 from examples.research_bot_ollama.manager import ResearchManager
+from examples.research_bot_ollama.agents.search_cache import CACHE_CONFIG
 
 # # 检查是否设置了OPENAI_API_KEY环境变量
 # if "OPENAI_API_KEY" not in os.environ:
@@ -23,8 +25,27 @@ external_client = AsyncOpenAI(
 set_default_openai_client(external_client, use_for_tracing=False)
 
 async def main() -> None:
+    parser = argparse.ArgumentParser(description="本地浏览器自动化检索研究助手")
+    parser.add_argument(
+        "--replay", action="store_true", help="只使用缓存的搜索结果，不打开浏览器（用于离线回放之前的研究）"
+    )
+    parser.add_argument(
+        "--search-mode", choices=ResearchManager.SEARCH_MODES, default="agent",
+        help="agent：逐条调用搜索代理；direct_batch：直接搜索后批量生成摘要；direct_raw：直接搜索且不生成摘要",
+    )
+    parser.add_argument("--search-deadline", type=float, default=180.0, help="整个搜索阶段的时间上限（秒）")
+    parser.add_argument("--search-timeout", type=float, default=60.0, help="单个搜索的时间上限（秒），从该搜索拿到运行名额时开始计时，包括模型调用")
+    parser.add_argument("--search-budget", type=int, default=5, help="最多执行的搜索数量（去重排序后按优先级选取）")
+    args = parser.parse_args()
+    if args.replay:
+        CACHE_CONFIG["mode"] = "replay"
     query = input("\n您想研究什么主题？ ")
-    await ResearchManager().run(query)
+    await ResearchManager(
+        search_mode=args.search_mode,
+        search_deadline=args.search_deadline,
+        per_search_timeout=args.search_timeout,
+        search_budget=args.search_budget,
+    ).run(query)
 
 
 if __name__ == "__main__":
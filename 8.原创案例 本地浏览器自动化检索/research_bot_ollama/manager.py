@@ -6,6 +6,7 @@ import os
 import datetime
 import random
 from pathlib import Path
+from typing import Awaitable, Callable
 
 from rich.console import Console
 
@@ -22,8 +23,14 @@ from agents.mlflow_tracing import (
 )
 import mlflow
 
+from .agents.browser_pool import close_browser_pool, get_browser_pool
+from .agents.cpu_pool import EventLoopLagMonitor, shutdown_cpu_executor
+from .agents.batch_summarizer_agent import BatchSummaries, batch_summarizer_agent, batch_summary_key, format_batch_input
+from .agents.browser_search import get_cached_search_result, record_tool_searches, run_browser_search
 from .agents.planner_agent import WebSearchItem, WebSearchPlan, planner_agent
-from .agents.search_agent import search_agent
+from .agents.search_agent import search_agent, search_summary_key, tool_queries_key
+from .agents.search_cache import caching_enabled, search_result_cache, summary_cache
+from .agents.search_ranking import rank_searches
 from .agents.writer_agent import ReportData, writer_agent
 from .printer import Printer
 
@@ -35,11 +42,45 @@ class ResearchManager:
     负责协调整个研究过程，包括搜索规划、执行搜索、报告生成和保存。
     使用异步方法实现并发操作，提高效率和响应速度。
     """
-    def __init__(self):
+    # 搜索模式
+    # - agent：每条搜索由搜索代理调用浏览器工具并生成摘要（每条搜索约2次模型调用）
+    # - direct_batch：直接并发执行浏览器搜索，再用一次模型调用批量生成所有摘要
+    # - direct_raw：直接并发执行浏览器搜索，不生成摘要，把搜索结果片段直接交给撰写代理
+    SEARCH_MODES = ("agent", "direct_batch", "direct_raw")
+
+    def __init__(
+        self,
+        search_mode: str = "agent",
+        search_deadline: float = 180.0,
+        per_search_timeout: float = 60.0,
+        search_budget: int = 5,
+    ):
+        """
+        参数:
+            search_mode: 搜索模式，见SEARCH_MODES
+            search_budget: 最多执行的搜索数量（去重排序后按优先级选取）
+            search_deadline: 整个搜索阶段的时间上限（秒），到期后中止所有未完成的搜索
+            per_search_timeout: 单个搜索的时间上限（秒），从该搜索拿到运行名额时开始计时
+        """
+        if search_mode not in self.SEARCH_MODES:
+            raise ValueError(f"未知的搜索模式: {search_mode}，可选: {', '.join(self.SEARCH_MODES)}")
+        self.search_mode = search_mode
+        self.search_deadline = search_deadline
+        self.per_search_timeout = per_search_timeout
+        self.search_budget = search_budget
+        # 因超时被中止的搜索数量
+        self.searches_cut = 0
         # 初始化Rich控制台对象，用于美化终端输出
         self.console = Console()
         # 初始化打印工具，用于格式化和管理研究过程中的各种输出信息
         self.printer = Printer(self.console)
+        # 搜索阶段的模型调用次数和模型调用累计耗时（秒）
+        self.search_model_calls = 0
+        self.search_model_seconds = 0.0
+        # 直接搜索模式下浏览器搜索的耗时（秒）
+        self.browser_seconds = 0.0
+        # 规划阶段实测的平均每次模型调用耗时（秒），搜索阶段没有模型调用时用于估算节省的时间
+        self.planner_call_seconds: float | None = None
 
     async def run(self, query: str) -> None:
         """
@@ -76,20 +117,28 @@ class ResearchManager:
                     # 规划搜索 - 使用规划代理生成搜索计划
                     search_plan = await self._plan_searches(query)
                     
-                    # 限制搜索数量 - 只选取前5条搜索，避免过多任务导致超时
-                    if len(search_plan.searches) > 5:
-                        self.printer.update_item(
-                            "planning",
-                            f"为提高稳定性，将只执行前5条搜索（共计划了{len(search_plan.searches)}条）",
-                            is_done=True,
-                        )
-                        search_plan.searches = search_plan.searches[:5]
+                    # 去除近似重复的搜索，按与问题的相关性和多样性排序，只执行前search_budget条
+                    search_plan = self._prioritize_searches(query, search_plan)
                     
                     # 执行搜索 - 并行执行所有搜索任务
-                    search_results = await self._perform_searches(search_plan)
+                    search_start = time.perf_counter()
+                    # 监视搜索阶段的事件循环延迟，检查是否有同步的CPU密集型工作阻塞了并发搜索
+                    async with EventLoopLagMonitor() as lag_monitor:
+                        if self.search_mode == "agent":
+                            search_results = await self._perform_searches(search_plan)
+                        else:
+                            search_results = await self._perform_direct_searches(search_plan)
+                    self._report_search_stats(len(search_plan.searches), time.perf_counter() - search_start)
+                    self.printer.update_item("loop_lag", lag_monitor.summary(), is_done=True)
                     
-                    # 生成报告 - 基于搜索结果生成研究报告
+                    # 生成报告 - 基于搜索结果生成研究报告（被中止的搜索不再等待）
                     report = await self._write_report(query, search_results)
+                    if self.searches_cut:
+                        completed = len(search_plan.searches) - self.searches_cut
+                        report.markdown_report += (
+                            f"\n\n> 注：共计划 {len(search_plan.searches)} 条搜索，其中 {self.searches_cut} 条因超出时间限制被中止，"
+                            f"本报告基于其余 {completed} 条搜索的结果。"
+                        )
 
                     # 显示报告摘要
                     final_report = f"报告摘要\n\n{report.short_summary}"
@@ -116,6 +165,10 @@ class ResearchManager:
         finally:
             # 恢复原始的Runner.run方法
             restore_runner(original_run)
+            # 关闭共享浏览器池中的浏览器
+            await close_browser_pool()
+            # 关闭HTML解析使用的执行池
+            shutdown_cpu_executor()
 
     async def _plan_searches(self, query: str) -> WebSearchPlan:
         """
@@ -140,10 +193,12 @@ class ResearchManager:
                     self.printer.update_item("planning", f"规划搜索中... (尝试 {attempt+1}/{max_attempts})")
                     
                     # 调用规划代理生成搜索计划
+                    planner_start = time.perf_counter()
                     result = await Runner.run(
                         planner_agent,
                         f"Query: {query}",
                     )
+                    self.planner_call_seconds = (time.perf_counter() - planner_start) / max(1, len(result.raw_responses))
                     
                     # 更新计划完成状态
                     self.printer.update_item(
@@ -162,6 +217,99 @@ class ResearchManager:
                         self.printer.update_item("planning", f"规划搜索尝试 {attempt+1} 失败: {str(e)}，正在重试...")
                         await asyncio.sleep(2)  # 等待一下再重试
 
+    def _prioritize_searches(self, query: str, search_plan: WebSearchPlan) -> WebSearchPlan:
+        """
+        对搜索计划去重并按优先级排序
+        
+        参数:
+            query: 用户查询字符串
+            search_plan: 规划代理生成的搜索计划
+            
+        返回:
+            WebSearchPlan: 去重后按优先级排列、不超过search_budget条的搜索计划
+        """
+        ranked = rank_searches(query, search_plan.searches, self.search_budget)
+        with mlflow.start_span(name="搜索去重和排序") as span:
+            span.set_attribute("planned_searches", len(search_plan.searches))
+            span.set_attribute("duplicate_searches", len(ranked.duplicates))
+            span.set_attribute("dropped_searches", len(ranked.dropped))
+        
+        if ranked.duplicates or ranked.dropped:
+            self.printer.update_item(
+                "prioritizing",
+                f"共计划了{len(search_plan.searches)}条搜索，合并{len(ranked.duplicates)}条近似重复的搜索，"
+                f"按优先级执行{len(ranked.selected)}条",
+                is_done=True,
+            )
+        return WebSearchPlan(searches=ranked.selected)
+
+    async def _run_searches_with_deadlines(
+        self, items: list[WebSearchItem], search_fn: Callable[[WebSearchItem], Awaitable[str | None]]
+    ) -> list[str | None]:
+        """
+        并发执行搜索，同时限制单个搜索和整个搜索阶段的时间
+        
+        参数:
+            items: 搜索项列表
+            search_fn: 执行单个搜索的协程函数
+            
+        返回:
+            list[str | None]: 与items一一对应的结果，失败、超时或被中止的搜索为None
+            
+        说明:
+            同时运行的搜索数量不超过浏览器池可租出的页面数。单个搜索的时间上限是整个搜索的预算，
+            从该搜索在管理器中拿到运行名额时开始计时：等待名额的时间不计入（但计入整个搜索阶段的时间），
+            名额之后的所有耗时都计入，包括agent模式下搜索代理的模型调用和Ollama排队，
+            以及搜索代理同一轮多次调用浏览器工具时等待浏览器池页面的时间；
+            超时的搜索会被真正取消，取消会传递到浏览器租用中，使对应的浏览器上下文被关闭；
+            整个搜索阶段到期后，所有未完成的搜索都会被取消，已完成的结果照常返回。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.search_deadline
+        self.searches_cut = 0
+        num_completed = 0
+        results: list[str | None] = [None] * len(items)
+        slots = asyncio.Semaphore(get_browser_pool().max_leases)
+        
+        async def bounded(item: WebSearchItem) -> str | None:
+            async with slots:
+                # 单个搜索的预算从拿到名额时开始计时；wait_for在超时时会取消搜索协程并等待它结束
+                return await asyncio.wait_for(search_fn(item), timeout=self.per_search_timeout)
+        
+        tasks = {asyncio.create_task(bounded(item)): i for i, item in enumerate(items)}
+        pending = set(tasks)
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    results[tasks[task]] = task.result()
+                except asyncio.TimeoutError:
+                    # 处理搜索超时
+                    self.searches_cut += 1
+                    self.printer.update_item("searching", f"搜索超时，已中止此项")
+                except Exception as e:
+                    # 处理搜索错误
+                    self.printer.update_item("searching", f"搜索出错: {str(e)}，跳过此项")
+                
+                # 更新完成状态
+                num_completed += 1
+                self.printer.update_item("searching", f"搜索中... {num_completed}/{len(items)} 已完成")
+        
+        if pending:
+            # 搜索阶段到期：取消剩余的搜索，并等待它们释放浏览器
+            self.searches_cut += len(pending)
+            self.printer.update_item(
+                "searching", f"搜索阶段超过 {self.search_deadline:g} 秒，中止剩余的 {len(pending)} 条搜索"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        return results
+
     async def _perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
         """
         执行搜索计划中的所有搜索
@@ -178,51 +326,140 @@ class ResearchManager:
         with step_span(name="执行网络搜索"):
             # 初始化搜索状态
             self.printer.update_item("searching", "搜索中...")
-            num_completed = 0
             
-            # 创建并行搜索任务
-            tasks = [asyncio.create_task(self._search(item)) for item in search_plan.searches]
+            raw_results = await self._run_searches_with_deadlines(search_plan.searches, self._search)
             results = []
+            for result in raw_results:
+                if result is not None and result.strip():  # 确保结果非空
+                    # 限制单个搜索结果的长度
+                    if len(result) > 1000:
+                        result = result[:997] + "..."
+                    results.append(result)
             
-            # 设置超时时间
-            search_timeout = 60  # 单位：秒
+            # 标记搜索完成
+            self.printer.mark_item_done("searching")
             
-            # 处理完成的任务
-            for task in asyncio.as_completed(tasks):
-                try:
-                    # 添加超时机制
-                    result = await asyncio.wait_for(task, timeout=search_timeout)
-                    if result is not None and result.strip():  # 确保结果非空
-                        # 限制单个搜索结果的长度
-                        if len(result) > 1000:
-                            result = result[:997] + "..."
-                        results.append(result)
-                except asyncio.TimeoutError:
-                    # 处理搜索超时
-                    self.printer.update_item(
-                        "searching", f"搜索超时，跳过此项"
-                    )
-                except Exception as e:
-                    # 处理搜索错误
-                    self.printer.update_item(
-                        "searching", f"搜索出错: {str(e)}，跳过此项"
-                    )
-                
-                # 更新完成状态
-                num_completed += 1
+            if caching_enabled():
                 self.printer.update_item(
-                    "searching", f"搜索中... {num_completed}/{len(tasks)} 已完成"
+                    "cache", f"{search_result_cache.stats()}；{summary_cache.stats()}", is_done=True
                 )
             
-            # 标记搜索完成
-            self.printer.mark_item_done("searching")
-            
             # 如果没有获取到任何结果，返回一个默认结果
             if not results:
                 return ["未能获取到有效的搜索结果。将基于现有知识生成报告。"]
                 
             return results
 
+    async def _perform_direct_searches(self, search_plan: WebSearchPlan) -> list[str]:
+        """
+        直接执行搜索计划中的所有搜索，不经过搜索代理
+        
+        参数:
+            search_plan: 搜索计划对象，包含多个搜索项
+            
+        返回:
+            list[str]: 搜索结果列表（direct_batch模式下为批量生成的摘要，direct_raw模式下为搜索结果片段）
+        """
+        with step_span(name="直接执行网络搜索"):
+            self.printer.update_item("searching", "搜索中...")
+            
+            async def search_one(item: WebSearchItem) -> str:
+                return await run_browser_search(item.query)
+            
+            browser_start = time.perf_counter()
+            raw_results = await self._run_searches_with_deadlines(search_plan.searches, search_one)
+            self.browser_seconds = time.perf_counter() - browser_start
+            self.printer.mark_item_done("searching")
+            
+            searches = [
+                (item.query, result)
+                for item, result in zip(search_plan.searches, raw_results)
+                if result is not None and result.strip()
+            ]
+            if not searches:
+                return ["未能获取到有效的搜索结果。将基于现有知识生成报告。"]
+            
+            if self.search_mode == "direct_raw":
+                results = [f"搜索词: {query}\n{result}" for query, result in searches]
+            else:
+                results = await self._summarize_batch(searches)
+            
+            # 限制单个搜索结果的长度
+            return [result[:997] + "..." if len(result) > 1000 else result for result in results]
+
+    async def _summarize_batch(self, searches: list[tuple[str, str]]) -> list[str]:
+        """
+        用一次模型调用为多条搜索结果生成摘要，已缓存的摘要直接使用
+        
+        参数:
+            searches: (搜索词, 搜索结果) 列表
+            
+        返回:
+            list[str]: 与searches一一对应的摘要；模型调用失败或遗漏的条目使用原始搜索结果
+        """
+        summaries: list[str | None] = [summary_cache.get(batch_summary_key(query, result)) if caching_enabled() else None
+                                       for query, result in searches]
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+        
+        if pending:
+            with mlflow.start_span(name="批量生成搜索摘要") as span:
+                span.set_attribute("batch_size", len(pending))
+                self.printer.update_item("summarizing", f"批量生成 {len(pending)} 条搜索摘要中...")
+                try:
+                    model_start = time.perf_counter()
+                    result = await Runner.run(
+                        batch_summarizer_agent,
+                        format_batch_input([searches[i] for i in pending]),
+                    )
+                    self.search_model_seconds += time.perf_counter() - model_start
+                    self.search_model_calls += len(result.raw_responses)
+                    # 批量输入中的编号从1开始，对应pending中的位置
+                    for entry in result.final_output_as(BatchSummaries).summaries:
+                        if 1 <= entry.index <= len(pending) and entry.summary.strip():
+                            i = pending[entry.index - 1]
+                            summaries[i] = entry.summary
+                            if caching_enabled():
+                                summary_cache.set(batch_summary_key(*searches[i]), entry.summary)
+                    self.printer.update_item("summarizing", f"已生成 {len(pending)} 条搜索摘要", is_done=True)
+                except Exception as e:
+                    span.set_attribute("error", str(e))
+                    self.printer.update_item(
+                        "summarizing", f"批量生成摘要失败: {str(e)}，使用原始搜索结果", is_done=True
+                    )
+        
+        return [
+            summary if summary is not None else f"搜索词: {query}\n{result}"
+            for summary, (query, result) in zip(summaries, searches)
+        ]
+
+    def _report_search_stats(self, num_searches: int, elapsed: float) -> None:
+        """显示搜索阶段的模型调用次数和耗时，以及与逐条调用搜索代理相比节省的模型调用和估算节省的时间"""
+        # 搜索代理模式下每条搜索约需2次模型调用：一次决定调用浏览器工具，一次生成摘要
+        agent_calls = 2 * num_searches
+        calls_saved = agent_calls - self.search_model_calls
+        message = f"搜索阶段耗时 {elapsed:.1f} 秒，模型调用 {self.search_model_calls} 次"
+        if self.search_mode != "agent":
+            message += (
+                f"（其中浏览器搜索 {self.browser_seconds:.1f} 秒；"
+                f"逐条调用搜索代理约需 {agent_calls} 次，节省 {calls_saved} 次"
+            )
+            # 本地Ollama基本逐个处理请求，节省的时间按本次实测的平均每次模型调用耗时估算；
+            # 批量调用一次生成多条摘要，比单条调用更慢，因此该估算偏高。
+            # direct_raw模式下搜索阶段没有模型调用，改用规划阶段实测的单次调用耗时（同一个模型）
+            if self.search_model_calls:
+                mean_call_seconds, source = self.search_model_seconds / self.search_model_calls, "平均每次模型调用"
+            else:
+                mean_call_seconds, source = self.planner_call_seconds, "规划阶段每次模型调用"
+            if mean_call_seconds is not None:
+                message += f"，按{source} {mean_call_seconds:.1f} 秒估算约节省 {calls_saved * mean_call_seconds:.1f} 秒"
+            message += "）"
+        self.printer.update_item("search_stats", message, is_done=True)
+        with mlflow.start_span(name="搜索阶段统计") as span:
+            span.set_attribute("search_mode", self.search_mode)
+            span.set_attribute("search_model_calls", self.search_model_calls)
+            span.set_attribute("search_model_seconds", self.search_model_seconds)
+            span.set_attribute("search_seconds", elapsed)
+
     async def _search(self, item: WebSearchItem) -> str | None:
         """
         执行单个搜索项
@@ -240,16 +477,41 @@ class ResearchManager:
                 span.set_attribute("search_query", item.query)
                 span.set_attribute("search_reason", item.reason)
                 
-                # 使用预定义的搜索代理执行搜索
+                # 搜索代理上次为该搜索词实际搜索的查询词（没有记录时假设直接搜索该词）的结果和摘要都已缓存时，
+                # 直接使用缓存的摘要，不再调用搜索代理
+                if caching_enabled():
+                    tool_queries = summary_cache.get(tool_queries_key(item.query)) or [item.query]
+                    cached_results = [get_cached_search_result(query) for query in tool_queries]
+                    if all(cached is not None for cached in cached_results):
+                        tool_searches = [(query, cached.snippets) for query, cached in zip(tool_queries, cached_results)]
+                        summary = summary_cache.get(search_summary_key(item.query, tool_searches))
+                        if summary is not None:
+                            span.set_attribute("summary_cache_hit", True)
+                            return summary
+
+                # 使用预定义的搜索代理执行搜索，同时记录搜索工具实际返回的片段
+                tool_searches = record_tool_searches()
+                model_start = time.perf_counter()
                 result = await Runner.run(
                     search_agent,
                     input,
                 )
+                # 搜索代理的耗时包含浏览器工具的执行时间
+                self.search_model_seconds += time.perf_counter() - model_start
+                self.search_model_calls += len(result.raw_responses)
                 
                 # 记录搜索结果状态
                 success = result and str(result.final_output).strip() != ""
                 span.set_attribute("search_success", success)
                 
+                # 以搜索代理实际看到的查询词和片段为键缓存摘要；有工具调用失败时摘要可能基于错误信息，不缓存
+                if (
+                    caching_enabled() and success and tool_searches
+                    and all(snippets for _, snippets in tool_searches)
+                ):
+                    summary_cache.set(tool_queries_key(item.query), [query for query, _ in tool_searches])
+                    summary_cache.set(search_summary_key(item.query, tool_searches), str(result.final_output))
+                
                 return str(result.final_output)
         except Exception as e:
             # 记录搜索错误